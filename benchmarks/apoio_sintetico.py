@@ -0,0 +1,60 @@
+"""
+Apoio aos benchmarks e testes que rodam o pipeline sobre dados sintéticos (src/dados_sinteticos.py):
+redirecionamento dos caminhos do ETL, execução silenciosa e construção de um banco publicado.
+"""
+import contextlib
+import io
+import os
+import tempfile
+
+from main import persistir_dados_sqlite
+from src import processamento
+from src.dados_sinteticos import gerar_dataset_sintetico, gerar_trimestres
+
+
+@contextlib.contextmanager
+def redirecionar_caminhos_etl(dataset, dir_saida):
+    """
+    Aponta temporariamente os caminhos do módulo de processamento para o dataset sintético.
+    """
+    originais = (processamento.PATH_ENTRADA_BRUTA, processamento.PATH_ENTRADA_CADOP,
+                 processamento.PATH_SAIDA_PROCESSADA)
+    processamento.PATH_ENTRADA_BRUTA = dataset['dir_extraidos']
+    processamento.PATH_ENTRADA_CADOP = dataset['dir_cadop']
+    processamento.PATH_SAIDA_PROCESSADA = dir_saida
+    try:
+        yield
+    finally:
+        (processamento.PATH_ENTRADA_BRUTA, processamento.PATH_ENTRADA_CADOP,
+         processamento.PATH_SAIDA_PROCESSADA) = originais
+
+
+def executar_silencioso(funcao, *args, **kwargs):
+    """
+    Executa a função descartando os prints do pipeline para manter relatórios e testes legíveis.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        return funcao(*args, **kwargs)
+
+
+def construir_banco_sintetico(caminho_banco, qtd_operadoras, qtd_trimestres, semente=42):
+    """
+    Gera dados sintéticos, executa o ETL e publica o resultado em caminho_banco com a mesma
+    rotina de carga do pipeline (persistir_dados_sqlite), como uma nova geração do banco.
+
+    Returns:
+        int: Linhas publicadas na tabela 'operadoras_despesas'.
+    """
+    with tempfile.TemporaryDirectory(prefix="banco_sintetico_") as tmp:
+        dataset = gerar_dataset_sintetico(
+            os.path.join(tmp, "downloads_ans"),
+            qtd_operadoras=qtd_operadoras,
+            trimestres=gerar_trimestres(qtd_trimestres),
+            linhas_por_operadora=4,
+            proporcao_cnpj_invalido=0.02,
+            semente=semente,
+        )
+        with redirecionar_caminhos_etl(dataset, os.path.join(tmp, "saida")):
+            resultado = executar_silencioso(processamento.executar_etl_financeiro)
+
+    return executar_silencioso(persistir_dados_sqlite, resultado, caminho_banco)
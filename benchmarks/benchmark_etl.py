@@ -0,0 +1,198 @@
+"""
+Benchmark offline do ETL financeiro sobre dados sintéticos (src/dados_sinteticos.py).
+
+Mede, em várias escalas, o tempo e o pico de memória de executar_etl_financeiro, além de
+micro-benchmarks de ler_arquivo_csv (por variante de encoding/separador) e validar_digitos_cnpj.
+Pode comparar o resultado com uma execução anterior e falhar caso a vazão caia além da tolerância.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.benchmark_etl --escalas 100,1000 --saida bench_etl.json
+    python -m benchmarks.benchmark_etl --baseline bench_etl.json --tolerancia 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from src import processamento
+from benchmarks.apoio_sintetico import executar_silencioso, redirecionar_caminhos_etl
+from src.dados_sinteticos import gerar_cnpj, gerar_dataset_sintetico, gerar_trimestres
+from src.perfilamento import ManifestoExecucao
+
+
+def medir_etl(dataset, dir_saida, repeticoes):
+    """
+    Mede o ETL completo: melhor tempo entre as repetições (sem tracemalloc) e pico de memória
+    em uma execução adicional instrumentada.
+    """
+    tempos = []
+    with redirecionar_caminhos_etl(dataset, dir_saida):
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            resultado = executar_silencioso(processamento.executar_etl_financeiro)
+            tempos.append(time.perf_counter() - inicio)
+
+        manifesto = ManifestoExecucao(medir_memoria=True)
+        with manifesto.etapa("etl") as medicao:
+            executar_silencioso(processamento.executar_etl_financeiro, manifesto)
+        tracemalloc.stop()
+
+    melhor = min(tempos)
+    linhas_saida = len(resultado['operadoras_despesas']) if resultado else 0
+    return {
+        'tempo_melhor_s': round(melhor, 6),
+        'tempo_medio_s': round(sum(tempos) / len(tempos), 6),
+        'linhas_entrada': dataset['total_linhas'],
+        'linhas_saida': linhas_saida,
+        'linhas_por_s': round(dataset['total_linhas'] / melhor, 1),
+        'pico_memoria_bytes': medicao.pico_memoria_bytes,
+        'arquivos': [m.para_dict() for m in manifesto.arquivos],
+    }
+
+
+def medir_leitura_csv(dataset, repeticoes):
+    """
+    Mede ler_arquivo_csv para cada arquivo gerado (uma variante de encoding/separador por trimestre).
+    """
+    resultados = []
+    for arquivo in dataset['arquivos']:
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            df = processamento.ler_arquivo_csv(arquivo['caminho'])
+            tempos.append(time.perf_counter() - inicio)
+        melhor = min(tempos)
+        resultados.append({
+            'variante': f"{arquivo['encoding']}|{arquivo['sep']}",
+            'linhas': len(df),
+            'tempo_melhor_s': round(melhor, 6),
+            'linhas_por_s': round(len(df) / melhor, 1),
+        })
+    return resultados
+
+
+def medir_validacao_cnpj(qtd, repeticoes, semente=42):
+    """
+    Mede validar_digitos_cnpj sobre uma mistura de CNPJs válidos e inválidos.
+    """
+    rng = random.Random(semente)
+    cnpjs = [gerar_cnpj(rng, valido=rng.random() >= 0.2) for _ in range(qtd)]
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for cnpj in cnpjs:
+            processamento.validar_digitos_cnpj(cnpj)
+        tempos.append(time.perf_counter() - inicio)
+    melhor = min(tempos)
+    return {'qtd': qtd, 'tempo_melhor_s': round(melhor, 6), 'cnpjs_por_s': round(qtd / melhor, 1)}
+
+
+def executar_benchmark(escalas, qtd_trimestres, linhas_por_operadora, repeticoes, semente=42):
+    relatorio = {
+        'data': datetime.now().isoformat(timespec="seconds"),
+        'ambiente': {'python': platform.python_version(), 'plataforma': platform.platform(),
+                     'cpus': os.cpu_count()},
+        'parametros': {'escalas': escalas, 'trimestres': qtd_trimestres,
+                       'linhas_por_operadora': linhas_por_operadora, 'repeticoes': repeticoes},
+        'escalas': [],
+    }
+
+    for qtd_operadoras in escalas:
+        with tempfile.TemporaryDirectory(prefix="bench_etl_") as tmp:
+            dataset = gerar_dataset_sintetico(
+                os.path.join(tmp, "downloads_ans"),
+                qtd_operadoras=qtd_operadoras,
+                trimestres=gerar_trimestres(qtd_trimestres),
+                linhas_por_operadora=linhas_por_operadora,
+                semente=semente,
+            )
+            etl = medir_etl(dataset, os.path.join(tmp, "saida"), repeticoes)
+            leitura = medir_leitura_csv(dataset, repeticoes)
+
+        relatorio['escalas'].append({'operadoras': qtd_operadoras, 'etl': etl, 'leitura_csv': leitura})
+        print(f"[BENCH] {qtd_operadoras:>6} operadoras | {etl['linhas_entrada']:>9} linhas | "
+              f"{etl['tempo_melhor_s']:8.3f} s | {etl['linhas_por_s']:>12,.0f} linhas/s | "
+              f"pico {etl['pico_memoria_bytes'] / 1024 ** 2:8.1f} MB")
+
+    relatorio['validacao_cnpj'] = medir_validacao_cnpj(50_000, repeticoes, semente)
+    print(f"[BENCH] validar_digitos_cnpj: {relatorio['validacao_cnpj']['cnpjs_por_s']:,.0f} CNPJs/s")
+    return relatorio
+
+
+def comparar_com_baseline(relatorio, baseline, tolerancia):
+    """
+    Compara a vazão (linhas/s) por escala com uma execução anterior.
+
+    Returns:
+        list[str]: Descrição das regressões acima da tolerância (lista vazia se não houver).
+    """
+    anteriores = {e['operadoras']: e['etl']['linhas_por_s'] for e in baseline.get('escalas', [])}
+    regressoes = []
+    for escala in relatorio['escalas']:
+        anterior = anteriores.get(escala['operadoras'])
+        if not anterior:
+            continue
+        atual = escala['etl']['linhas_por_s']
+        if atual < anterior * (1 - tolerancia):
+            regressoes.append(f"{escala['operadoras']} operadoras: {atual:,.0f} linhas/s "
+                              f"(baseline {anterior:,.0f}, queda de {1 - atual / anterior:.0%})")
+
+    cnpj_anterior = baseline.get('validacao_cnpj', {}).get('cnpjs_por_s')
+    cnpj_atual = relatorio['validacao_cnpj']['cnpjs_por_s']
+    if cnpj_anterior and cnpj_atual < cnpj_anterior * (1 - tolerancia):
+        regressoes.append(f"validar_digitos_cnpj: {cnpj_atual:,.0f} CNPJs/s (baseline {cnpj_anterior:,.0f})")
+    return regressoes
+
+
+def parse_argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline do ETL financeiro com dados sintéticos.")
+    parser.add_argument("--escalas", default="100,500,2000",
+                        help="Quantidades de operadoras a testar, separadas por vírgula.")
+    parser.add_argument("--trimestres", type=int, default=3, help="Trimestres gerados por escala.")
+    parser.add_argument("--linhas-por-operadora", type=int, default=20,
+                        help="Lançamentos contábeis por operadora em cada trimestre.")
+    parser.add_argument("--repeticoes", type=int, default=3, help="Repetições por medição (usa o melhor tempo).")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", default="bench_etl.json", help="Arquivo JSON com o relatório.")
+    parser.add_argument("--baseline", help="Relatório anterior para detecção de regressão.")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="Queda máxima de vazão aceita em relação ao baseline (0.2 = 20%%).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_argumentos(argv)
+    escalas = [int(e) for e in args.escalas.split(',') if e.strip()]
+
+    relatorio = executar_benchmark(escalas, args.trimestres, args.linhas_por_operadora,
+                                   args.repeticoes, args.semente)
+
+    # Lê o baseline antes de gravar, pois ele pode ser o mesmo arquivo de saída
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"[BENCH] Relatório salvo em: {args.saida}")
+
+    if baseline is not None:
+        regressoes = comparar_com_baseline(relatorio, baseline, args.tolerancia)
+        if regressoes:
+            print("[REGRESSÃO] Vazão abaixo do baseline:")
+            for r in regressoes:
+                print(f"   - {r}")
+            return 1
+        print("[OK] Nenhuma regressão de performance acima da tolerância.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
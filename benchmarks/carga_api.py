@@ -0,0 +1,327 @@
+"""
+Teste de carga da API (src/api.py) sobre um banco sintético de tamanho configurável.
+
+Gera dados sintéticos (operadoras x trimestres), executa o ETL real e a carga no SQLite,
+sobe a API em processo (ASGI, sem rede) ou via uvicorn em localhost e dispara um workload
+misto contra as quatro rotas com concorrência configurável. Reporta vazão e latências
+p50/p95/p99 por rota e por cenário, salvando o resultado em JSON para comparação.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.carga_api --operadoras 2000 --trimestres 12 --concorrencia 8 --duracao 30
+    python -m benchmarks.carga_api --modo asgi --requisicoes 2000
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from benchmarks.apoio_sintetico import construir_banco_sintetico
+
+DIRETORIO_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Peso relativo de cada cenário no workload misto
+CENARIOS = {
+    "listar_padrao": 10,
+    "listar_busca_razao": 8,
+    "listar_busca_cnpj": 5,
+    "listar_busca_uf": 5,
+    "listar_busca_registro": 4,
+    "listar_busca_geral": 3,
+    "listar_pagina_profunda": 8,
+    "listar_ordem_asc": 5,
+    "listar_ordem_desc": 8,
+    "detalhes_operadora": 15,
+    "historico_despesas": 15,
+    "estatisticas": 6,
+}
+
+
+# --- PREPARAÇÃO DO BANCO ---
+def carregar_amostras(caminho_banco):
+    """
+    Lê do banco os valores usados para parametrizar o workload (CNPJs, registros, razões e UFs).
+    """
+    conn = sqlite3.connect(caminho_banco)
+    try:
+        linhas = conn.execute(
+            "SELECT DISTINCT CNPJ, Registro_ANS, Razao_Social, UF FROM operadoras_despesas"
+        ).fetchall()
+    finally:
+        conn.close()
+    return {
+        "cnpjs": [l[0] for l in linhas],
+        "registros": [str(l[1]) for l in linhas],
+        "termos_razao": sorted({l[2].split(' ')[0] for l in linhas}),
+        "ufs": sorted({l[3] for l in linhas}),
+        "total_operadoras": len({l[0] for l in linhas}),
+    }
+
+
+# --- WORKLOAD ---
+def montar_requisicao(cenario, amostras, rng):
+    """
+    Retorna (rota, caminho, params) para o cenário informado.
+    """
+    limite = 10
+    ultima_pagina = max(1, -(-amostras["total_operadoras"] // limite))
+
+    if cenario == "detalhes_operadora":
+        return "/api/operadoras/{cnpj}", f"/api/operadoras/{rng.choice(amostras['cnpjs'])}", {}
+    if cenario == "historico_despesas":
+        return "/api/operadoras/{cnpj}/despesas", f"/api/operadoras/{rng.choice(amostras['cnpjs'])}/despesas", {}
+    if cenario == "estatisticas":
+        return "/api/estatisticas", "/api/estatisticas", {}
+
+    params = {"page": 1, "limit": limite}
+    if cenario == "listar_busca_razao":
+        params.update(q=rng.choice(amostras["termos_razao"]), field="razao")
+    elif cenario == "listar_busca_geral":
+        params.update(q=rng.choice(amostras["termos_razao"]), field="geral")
+    elif cenario == "listar_busca_cnpj":
+        cnpj = rng.choice(amostras["cnpjs"])
+        inicio = rng.randint(0, 8)
+        params.update(q=cnpj[inicio:inicio + 6], field="cnpj")
+    elif cenario == "listar_busca_uf":
+        params.update(q=rng.choice(amostras["ufs"]), field="uf")
+    elif cenario == "listar_busca_registro":
+        params.update(q=rng.choice(amostras["registros"])[:4], field="registro")
+    elif cenario == "listar_pagina_profunda":
+        params["page"] = rng.randint(max(1, ultima_pagina * 3 // 4), ultima_pagina)
+    elif cenario == "listar_ordem_asc":
+        params.update(sort_order="asc", page=rng.randint(1, ultima_pagina))
+    elif cenario == "listar_ordem_desc":
+        params.update(sort_order="desc", page=rng.randint(1, ultima_pagina))
+    return "/api/operadoras", "/api/operadoras", params
+
+
+class ColetorResultados:
+    """
+    Acumula (rota, cenário, latência, status) de todas as threads do gerador de carga.
+    """
+
+    def __init__(self):
+        self.amostras = []
+        self._lock = threading.Lock()
+
+    def registrar(self, rota, cenario, latencia, status):
+        with self._lock:
+            self.amostras.append((rota, cenario, latencia, status))
+
+
+def percentil(valores_ordenados, p):
+    """
+    Percentil pelo método nearest-rank.
+    """
+    if not valores_ordenados:
+        return None
+    indice = max(0, min(len(valores_ordenados) - 1, math.ceil(p / 100 * len(valores_ordenados)) - 1))
+    return valores_ordenados[indice]
+
+
+def resumir(amostras, duracao_total):
+    """
+    Agrupa as amostras e calcula vazão, taxa de erro e latências (ms).
+    """
+    latencias = sorted(a[2] for a in amostras)
+    erros = sum(1 for a in amostras if a[3] >= 500 or a[3] == 0)
+    return {
+        "requisicoes": len(amostras),
+        "erros": erros,
+        "vazao_rps": round(len(amostras) / duracao_total, 1) if duracao_total else None,
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2) if latencias else None,
+        "p95_ms": round(percentil(latencias, 95) * 1000, 2) if latencias else None,
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2) if latencias else None,
+        "max_ms": round(latencias[-1] * 1000, 2) if latencias else None,
+    }
+
+
+def executar_worker(enviar, amostras, coletor, semente, prazo, cota):
+    """
+    Loop fechado de um usuário virtual: escolhe um cenário, envia, mede, repete.
+    Para ao atingir o prazo (modo duração) ou a cota de requisições.
+    """
+    rng = random.Random(semente)
+    nomes, pesos = zip(*CENARIOS.items())
+    enviadas = 0
+    while (prazo is None or time.perf_counter() < prazo) and (cota is None or enviadas < cota):
+        cenario = rng.choices(nomes, pesos)[0]
+        rota, caminho, params = montar_requisicao(cenario, amostras, rng)
+        inicio = time.perf_counter()
+        try:
+            status = enviar(caminho, params)
+        except Exception:
+            status = 0
+        coletor.registrar(rota, cenario, time.perf_counter() - inicio, status)
+        enviadas += 1
+
+
+# --- SERVIDORES ---
+def porta_livre():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def iniciar_uvicorn(caminho_banco, porta, workers):
+    """
+    Sobe a API em um processo uvicorn separado (servindo caminho_banco) e aguarda ficar disponível.
+    """
+    env = dict(os.environ, INTUITIVE_CARE_DB=caminho_banco)
+    processo = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.api:app", "--host", "127.0.0.1", "--port", str(porta),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=DIRETORIO_RAIZ, env=env,
+    )
+    url = f"http://127.0.0.1:{porta}"
+    for _ in range(100):
+        try:
+            if requests.get(url + "/docs", timeout=1).status_code == 200:
+                return processo, url
+        except requests.RequestException:
+            time.sleep(0.1)
+    processo.terminate()
+    raise RuntimeError("uvicorn não respondeu a tempo")
+
+
+def criar_enviador_http(url):
+    sessoes = threading.local()
+
+    def enviar(caminho, params):
+        if not hasattr(sessoes, "sessao"):
+            sessoes.sessao = requests.Session()
+        return sessoes.sessao.get(url + caminho, params=params, timeout=30).status_code
+
+    return enviar
+
+
+def criar_enviador_asgi(caminho_banco):
+    from fastapi.testclient import TestClient
+    from src import api
+
+    api.DB_PATH = caminho_banco
+    clientes = threading.local()
+
+    def enviar(caminho, params):
+        if not hasattr(clientes, "cliente"):
+            clientes.cliente = TestClient(api.app)
+        return clientes.cliente.get(caminho, params=params).status_code
+
+    return enviar
+
+
+# --- ORQUESTRAÇÃO ---
+def executar_carga(enviar, amostras, concorrencia, duracao=None, requisicoes=None, semente=42):
+    coletor = ColetorResultados()
+    prazo = time.perf_counter() + duracao if duracao else None
+    cota = -(-requisicoes // concorrencia) if requisicoes else None
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        futuros = [
+            executor.submit(executar_worker, enviar, amostras, coletor, semente + i, prazo, cota)
+            for i in range(concorrencia)
+        ]
+        for futuro in futuros:
+            futuro.result()
+    duracao_total = time.perf_counter() - inicio
+
+    por_rota, por_cenario = {}, {}
+    for amostra in coletor.amostras:
+        por_rota.setdefault(amostra[0], []).append(amostra)
+        por_cenario.setdefault(amostra[1], []).append(amostra)
+
+    return {
+        "duracao_s": round(duracao_total, 3),
+        "total": resumir(coletor.amostras, duracao_total),
+        "por_rota": {rota: resumir(a, duracao_total) for rota, a in sorted(por_rota.items())},
+        "por_cenario": {c: resumir(a, duracao_total) for c, a in sorted(por_cenario.items())},
+    }
+
+
+def imprimir_resumo(resultado):
+    print(f"\n{'ROTA':<34}{'REQ':>8}{'ERR':>6}{'RPS':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    linhas = list(resultado["por_rota"].items()) + [("TOTAL", resultado["total"])]
+    for rota, r in linhas:
+        print(f"{rota:<34}{r['requisicoes']:>8}{r['erros']:>6}{r['vazao_rps']:>9}"
+              f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}")
+
+
+def parse_argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga da API sobre um banco sintético.")
+    parser.add_argument("--operadoras", type=int, default=1000)
+    parser.add_argument("--trimestres", type=int, default=8)
+    parser.add_argument("--banco", help="Caminho do banco sintético (Padrão: arquivo temporário).")
+    parser.add_argument("--reusar-banco", action="store_true", help="Não recria o banco se ele já existir.")
+    parser.add_argument("--modo", choices=["uvicorn", "asgi"], default="uvicorn",
+                        help="uvicorn: servidor real em localhost; asgi: app em processo, sem rede.")
+    parser.add_argument("--workers", type=int, default=1, help="Workers do uvicorn.")
+    parser.add_argument("--concorrencia", type=int, default=8, help="Usuários virtuais simultâneos.")
+    parser.add_argument("--duracao", type=float, default=20.0, help="Duração do teste em segundos.")
+    parser.add_argument("--requisicoes", type=int, help="Total de requisições (substitui --duracao).")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", default="bench_api.json", help="Arquivo JSON com o relatório.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_argumentos(argv)
+    banco = args.banco or os.path.join(tempfile.gettempdir(), f"carga_api_{args.operadoras}x{args.trimestres}.db")
+
+    if not (args.reusar_banco and os.path.exists(banco)):
+        print(f"[CARGA] Gerando banco sintético ({args.operadoras} operadoras x {args.trimestres} trimestres)...")
+        linhas = construir_banco_sintetico(banco, args.operadoras, args.trimestres, args.semente)
+        print(f"[CARGA] {linhas} linhas gravadas em {banco}")
+
+    amostras = carregar_amostras(banco)
+
+    processo = None
+    try:
+        if args.modo == "uvicorn":
+            processo, url = iniciar_uvicorn(banco, porta_livre(), args.workers)
+            enviar = criar_enviador_http(url)
+        else:
+            enviar = criar_enviador_asgi(banco)
+
+        print(f"[CARGA] Disparando workload ({args.modo}, concorrência {args.concorrencia})...")
+        resultado = executar_carga(
+            enviar, amostras, args.concorrencia,
+            duracao=None if args.requisicoes else args.duracao,
+            requisicoes=args.requisicoes, semente=args.semente,
+        )
+    finally:
+        if processo is not None:
+            processo.terminate()
+            processo.wait(timeout=10)
+
+    relatorio = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "ambiente": {"python": platform.python_version(), "plataforma": platform.platform(),
+                     "cpus": os.cpu_count()},
+        "parametros": {k: v for k, v in vars(args).items() if k != "saida"},
+        "banco": {"caminho": banco, "tamanho_bytes": os.path.getsize(banco),
+                  "operadoras": amostras["total_operadoras"]},
+        **resultado,
+    }
+
+    imprimir_resumo(resultado)
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"\n[CARGA] Relatório salvo em: {args.saida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,72 +1,602 @@
+import argparse
+import contextlib
+import queue
+import pandas as pd
 import sqlite3
 import os
 import sys
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: trava de arquivo via msvcrt
+    fcntl = None
+    import msvcrt
 
 # --- IMPORTAÇÕES ---
-from src.coleta import executar_coleta
-from src.processamento import executar_etl_financeiro
+from src.coleta import (
+    executar_coleta, DIR_DOWNLOADS, inicializar_estrutura_pastas,
+    identificar_periodos_recentes, realizar_download_extrair, baixar_cadop
+)
+from src.processamento import (
+    executar_etl_financeiro, inicializar_diretorios, processar_periodo
+)
+from src.processamento_sql import (
+    executar_etl_financeiro_sql, abrir_banco_staging, conectar_staging, carregar_cadop_staging,
+    consolidar_staging, descartar_staging, inserir_pre_agregados
+)
+from src.perfilamento import ManifestoExecucao, medir_etapa
 
 # Configuração do Ambiente
 DIRETORIO_RAIZ = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(DIRETORIO_RAIZ, "intuitive_care.db")
+# Capacidade das filas download -> processamento -> carga no modo pipeline (backpressure)
+TAMANHO_FILA_PIPELINE = 2
+FIM_FILA = object()
+
+MANIFESTO_PATH = os.path.join(DIRETORIO_RAIZ, "manifesto_execucao.json")
+DIR_PERFIS = os.path.join(DIRETORIO_RAIZ, "perfis")
 
 
-def persistir_dados_sqlite(dataset):
+def calcular_tamanho_diretorio(diretorio):
     """
-    Persiste os DataFrames processados no banco de dados SQLite.
+    Soma o tamanho (bytes) de todos os arquivos de um diretório, recursivamente.
+    """
+    total = 0
+    for raiz, _, arquivos in os.walk(diretorio):
+        for nome in arquivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, nome))
+            except OSError:
+                continue
+    return total
+
+
+# Chave de clusterização das tabelas de serviço: linhas do mesmo trimestre ficam contíguas
+CHAVE_CLUSTER_PERIODO = ['Periodo', 'Registro_ANS', 'Ano', 'Trimestre']
+
+# Índices de cobertura desenhados para as consultas da API (src/api.py). Em tabelas WITHOUT ROWID,
+# todo índice já carrega as colunas da chave primária (Periodo, Registro_ANS, Ano, Trimestre).
+INDICES_COBERTURA = {
+    'operadoras_despesas': {
+        # Detalhes e histórico por CNPJ (busca O(log n), com ou sem faixa de períodos), além de
+        # listagem e ranking agrupados por CNPJ sem acessar a tabela
+        'idx_operadoras_despesas_cnpj': ['CNPJ', 'Periodo', 'Total_Despesas', 'Razao_Social', 'UF',
+                                         'Modalidade', 'Data'],
+        # Distribuição por UF e totais/médias gerais
+        'idx_operadoras_despesas_uf': ['UF', 'Total_Despesas'],
+        # Sem índice próprio para Registro_ANS: a busca por registro é LIKE '%q%' (B-Tree não ajuda)
+        # e a coluna já está na chave primária, presente em todos os índices acima
+    },
+}
+
+
+def criar_indices_cobertura(tabela, conn):
+    """
+    Cria os índices de INDICES_COBERTURA da tabela após a carga (mais barato que mantê-los
+    durante os inserts). Índices com colunas ausentes no DataFrame gravado são ignorados.
+    """
+    colunas_tabela = {linha[1] for linha in conn.execute(f'PRAGMA table_info("{tabela}")')}
+    for nome, colunas in INDICES_COBERTURA.get(tabela, {}).items():
+        if not set(colunas).issubset(colunas_tabela):
+            continue
+        lista_colunas = ", ".join(f'"{c}"' for c in colunas)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "{nome}" ON "{tabela}" ({lista_colunas})')
+
+
+def gravar_tabela_particionada(df, tabela, conn):
+    """
+    Recria a tabela clusterizada por período: WITHOUT ROWID com chave primária iniciada em
+    'Periodo' (Ano * 10 + Trimestre). Consultas com faixa de períodos leem apenas o trecho
+    da B-Tree correspondente, em vez de varrer a tabela inteira. Ao final, cria os índices
+    de cobertura da tabela.
+    """
+    if not set(CHAVE_CLUSTER_PERIODO).issubset(df.columns):
+        df.to_sql(tabela, conn, if_exists='replace', index=False)
+    else:
+        df = df.sort_values(CHAVE_CLUSTER_PERIODO)
+        ddl = pd.io.sql.get_schema(df, tabela, keys=CHAVE_CLUSTER_PERIODO, con=conn) + " WITHOUT ROWID"
+        conn.execute(f'DROP TABLE IF EXISTS "{tabela}"')
+        conn.execute(ddl)
+        df.to_sql(tabela, conn, if_exists='append', index=False)
+
+    criar_indices_cobertura(tabela, conn)
+    conn.commit()
+
+
+def ler_geracao_banco(caminho_banco):
+    """
+    Geração publicada no arquivo do banco (PRAGMA user_version), ou 0 se ele ainda não existir.
+    """
+    if not os.path.exists(caminho_banco):
+        return 0
+    conn = sqlite3.connect(caminho_banco)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def verificar_banco(caminho_banco, linhas_esperadas):
+    """
+    Checagens de um banco recém-construído antes de publicá-lo para a API.
+
+    Args:
+        caminho_banco (str): Arquivo construído (ainda não publicado).
+        linhas_esperadas (int): Linhas gravadas em 'operadoras_despesas'.
+
+    Returns:
+        list[str]: Problemas encontrados (lista vazia se o banco puder ser publicado).
+    """
+    problemas = []
+    conn = sqlite3.connect(caminho_banco)
+    try:
+        integridade = [linha[0] for linha in conn.execute("PRAGMA integrity_check")]
+        if integridade != ["ok"]:
+            problemas.append(f"integrity_check: {'; '.join(integridade[:5])}")
+
+        tabelas = {linha[0] for linha in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if 'operadoras_despesas' not in tabelas:
+            return problemas + ["tabela 'operadoras_despesas' ausente"]
+
+        linhas = conn.execute("SELECT COUNT(*) FROM operadoras_despesas").fetchone()[0]
+        if linhas != linhas_esperadas:
+            problemas.append(f"'operadoras_despesas' com {linhas} linhas (esperado: {linhas_esperadas})")
+
+        indices = {linha[0] for linha in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        for nome in INDICES_COBERTURA['operadoras_despesas']:
+            if nome not in indices:
+                problemas.append(f"índice '{nome}' ausente")
+
+        if 'sqlite_stat1' not in tabelas:
+            problemas.append("estatísticas do ANALYZE ausentes")
+    finally:
+        conn.close()
+    return problemas
+
+
+def criar_arquivo_construcao(caminho_banco):
+    """
+    Cria um arquivo exclusivo desta carga ao lado do banco publicado (ex: intuitive_care.db.x1y2.novo).
+    Cargas simultâneas constroem cada uma o seu arquivo, e nenhuma remove o arquivo da outra.
+    """
+    diretorio = os.path.dirname(os.path.abspath(caminho_banco))
+    descritor, caminho_novo = tempfile.mkstemp(dir=diretorio, prefix=os.path.basename(caminho_banco) + ".",
+                                               suffix=".novo")
+    os.close(descritor)
+    return caminho_novo
+
+
+def remover_arquivo_construcao(caminho_novo):
+    """
+    Remove o arquivo de construção desta carga (e o journal do SQLite), se ainda existirem.
+    """
+    for sufixo in ("", "-journal"):
+        if os.path.exists(caminho_novo + sufixo):
+            os.remove(caminho_novo + sufixo)
+
+
+@contextlib.contextmanager
+def bloquear_publicacao(caminho_banco):
+    """
+    Trava exclusiva (<banco>.lock) que serializa a publicação entre processos: a leitura da geração
+    atual e a troca do arquivo acontecem sem que outra carga publique no meio.
+    """
+    with open(caminho_banco + ".lock", "a+b") as trava:
+        if fcntl is not None:
+            fcntl.flock(trava.fileno(), fcntl.LOCK_EX)
+        else:
+            trava.seek(0)
+            # LK_LOCK tenta por ~10 s e então falha; repete até obter a trava
+            while True:
+                try:
+                    msvcrt.locking(trava.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(trava.fileno(), fcntl.LOCK_UN)
+            else:
+                trava.seek(0)
+                msvcrt.locking(trava.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def publicar_banco(caminho_novo, caminho_banco, linhas_esperadas):
+    """
+    Verifica o banco construído e o publica com uma troca atômica (os.replace), como a geração
+    seguinte à publicada (PRAGMA user_version).
+
+    Returns:
+        int: Geração publicada.
+
+    Raises:
+        RuntimeError: Banco novo reprovado nas verificações, ou arquivo publicado em uso no Windows
+            (a geração anterior é mantida em ambos os casos).
+    """
+    problemas = verificar_banco(caminho_novo, linhas_esperadas)
+    if problemas:
+        for problema in problemas:
+            print(f"   - {problema}")
+        raise RuntimeError(f"banco novo reprovado em {len(problemas)} verificação(ões); "
+                           f"a geração publicada foi mantida")
+
+    with bloquear_publicacao(caminho_banco):
+        geracao = ler_geracao_banco(caminho_banco) + 1
+        conn = sqlite3.connect(caminho_novo)
+        try:
+            conn.execute(f"PRAGMA user_version = {int(geracao)}")
+            conn.commit()
+        finally:
+            conn.close()
+
+        # Publicação atômica: leitores veem a geração anterior inteira ou a nova inteira
+        try:
+            os.replace(caminho_novo, caminho_banco)
+        except PermissionError as e:
+            # No Windows um arquivo aberto não pode ser substituído: a troca com a API no ar é só POSIX
+            raise RuntimeError(f"não foi possível substituir {caminho_banco} (arquivo em uso; no Windows "
+                               f"pare a API antes da carga); a geração publicada foi mantida") from e
+
+    print(f"[DB] Geração {geracao} publicada.")
+    return geracao
+
+
+def gravar_tabelas_banco(dataset, conn):
+    """
+    Grava as tabelas do dataset no banco em construção e coleta as estatísticas (ANALYZE)
+    para o planejador de consultas escolher os índices de cobertura.
+
+    Returns:
+        int: Linhas gravadas na tabela 'operadoras_despesas' (0 se não houver o que publicar).
+    """
+    linhas_gravadas = 0
+
+    # Salva a tabela consolidada
+    # O processamento retorna um dict, usando 'operadoras_despesas'
+    if 'operadoras_despesas' in dataset and not dataset['operadoras_despesas'].empty:
+        gravar_tabela_particionada(dataset['operadoras_despesas'], 'operadoras_despesas', conn)
+        linhas_gravadas = len(dataset['operadoras_despesas'])
+        print(f"[DB] Tabela 'operadoras_despesas' atualizada com sucesso.")
+
+    # Salva a tabela de histórico (se houver lógica diferente, aqui é igual)
+    if 'historico_despesas' in dataset and not dataset['historico_despesas'].empty:
+        gravar_tabela_particionada(dataset['historico_despesas'], 'historico_despesas', conn)
+        print(f"[DB] Tabela 'historico_despesas' atualizada com sucesso.")
+
+    if linhas_gravadas:
+        conn.execute("ANALYZE")
+        conn.commit()
+    return linhas_gravadas
+
+
+def persistir_dados_sqlite(dataset, caminho_banco=None):
+    """
+    Persiste os DataFrames processados no banco de dados SQLite sem interromper a API.
+
+    O banco é construído em um arquivo exclusivo desta carga ao lado do publicado, verificado
+    (integrity_check, contagem de linhas, índices e ANALYZE) e só então publicado com uma troca
+    atômica (os.replace). A geração publicada (PRAGMA user_version) é incrementada a cada carga,
+    sob uma trava que serializa cargas simultâneas, e a API reabre suas conexões ao detectar o novo
+    arquivo. Se a construção ou alguma checagem falhar, o banco publicado permanece intacto e o erro
+    é propagado para o pipeline.
+
+    Args:
+        dataset (dict): Saída de executar_etl_financeiro.
+        caminho_banco (str, opcional): Arquivo de destino (Padrão: DB_PATH).
+
+    Returns:
+        int: Quantidade de linhas publicadas na tabela 'operadoras_despesas'.
+
+    Raises:
+        RuntimeError: Banco novo reprovado nas verificações (a geração anterior foi mantida).
     """
     if not dataset:
         print("[ERRO] O dataset está vazio. Verifique o log de processamento.")
-        return
+        return 0
 
-    print(f"\n--- ATUALIZANDO BANCO DE DADOS ({DB_PATH}) ---")
+    caminho_banco = caminho_banco or DB_PATH
+    print(f"\n--- ATUALIZANDO BANCO DE DADOS ({caminho_banco}) ---")
 
+    caminho_novo = criar_arquivo_construcao(caminho_banco)
     conn = None
+    linhas_gravadas = 0
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = sqlite3.connect(caminho_novo)
+        linhas_gravadas = gravar_tabelas_banco(dataset, conn)
+        conn.close()
+        conn = None
 
-        # Salva a tabela consolidada
-        # O processamento retorna um dict, usando 'operadoras_despesas'
-        if 'operadoras_despesas' in dataset and not dataset['operadoras_despesas'].empty:
-            dataset['operadoras_despesas'].to_sql('operadoras_despesas', conn, if_exists='replace', index=False)
-            print(f"[DB] Tabela 'operadoras_despesas' atualizada com sucesso.")
+        if not linhas_gravadas:
+            print("[AVISO] Nenhuma linha para gravar. O banco publicado foi mantido.")
+            return 0
 
-        # Salva a tabela de histórico (se houver lógica diferente, aqui é igual)
-        if 'historico_despesas' in dataset and not dataset['historico_despesas'].empty:
-            dataset['historico_despesas'].to_sql('historico_despesas', conn, if_exists='replace', index=False)
-            print(f"[DB] Tabela 'historico_despesas' atualizada com sucesso.")
+        publicar_banco(caminho_novo, caminho_banco, linhas_gravadas)
 
     except Exception as e:
         print(f"[ERRO] Falha na persistência SQL: {e}")
+        raise
     finally:
         if conn:
             conn.close()
+        remover_arquivo_construcao(caminho_novo)
+
+    print("\n=== FINALIZADO COM SUCESSO ===")
+    return linhas_gravadas
+
+
+def _enfileirar(fila, item, cancelado):
+    """
+    Insere na fila limitada, bloqueando enquanto o estágio seguinte estiver ocupado (backpressure).
+    Desiste caso o pipeline tenha sido cancelado por erro em outro estágio.
+    """
+    while not cancelado.is_set():
+        try:
+            fila.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _desenfileirar(fila, cancelado):
+    while not cancelado.is_set():
+        try:
+            return fila.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return FIM_FILA
+
+
+def _proteger(funcao, erros, cancelado):
+    """
+    Envolve o alvo de uma thread: registra a exceção e cancela os demais estágios.
+    """
+    def executar():
+        try:
+            funcao()
+        except Exception as e:
+            print(f"[ERRO] Estágio '{funcao.__name__}' interrompido: {e}")
+            erros.append(e)
+            cancelado.set()
+    return executar
+
+
+def executar_pipeline_sobreposto(manifesto=None, workers_download=2, tamanho_fila=TAMANHO_FILA_PIPELINE,
+                                 qtd_trimestres=3, usar_particoes=False, caminho_banco=None):
+    """
+    Executa coleta, processamento e carga de forma sobreposta:
+    download -> [fila] -> processamento do trimestre -> [fila] -> carga no banco em construção.
+
+    Cada trimestre baixado é processado imediatamente, e seus pré-agregados são gravados em uma
+    tabela de staging dentro do arquivo de construção do banco enquanto os demais trimestres ainda
+    estão em download ou processamento. As filas limitadas aplicam backpressure: um estágio só
+    entrega o próximo trimestre quando houver espaço na fila do estágio seguinte.
+
+    As etapas que dependem de todos os trimestres rodam uma única vez ao final, em SQL sobre o
+    staging (Join com o CADOP, agregação 2.3 e deduplicação, as mesmas do motor SQL), seguidas
+    da gravação das tabelas finais, índices, ANALYZE e da publicação atômica (publicar_banco).
+
+    Args:
+        qtd_trimestres (int | None): Trimestres a coletar (None = histórico completo).
+        usar_particoes (bool): Reaproveita os pré-agregados particionados já atualizados.
+        caminho_banco (str, opcional): Banco publicado ao final (Padrão: DB_PATH).
+
+    Returns:
+        dict | None: Mesma saída de executar_etl_financeiro (já publicada em caminho_banco).
+
+    Raises:
+        RuntimeError: Falha em algum estágio ou banco novo reprovado (a geração anterior é mantida).
+    """
+    print("=== INICIANDO PIPELINE SOBREPOSTO (DOWNLOAD -> PROCESSAMENTO -> CARGA) ===")
+    inicializar_estrutura_pastas()
+    inicializar_diretorios()
+    caminho_banco = caminho_banco or DB_PATH
+
+    alvos = identificar_periodos_recentes(qtd_trimestres)
+    print(f"[INFO] Períodos identificados para download: {[a['periodo'] for a in alvos]}")
+
+    fila_alvos = queue.Queue()
+    for alvo in alvos:
+        fila_alvos.put(alvo)
+
+    fila_processamento = queue.Queue(maxsize=tamanho_fila)
+    fila_carga = queue.Queue(maxsize=tamanho_fila)
+    cancelado = threading.Event()
+    erros = []
+
+    def worker_download():
+        while not cancelado.is_set():
+            try:
+                alvo = fila_alvos.get_nowait()
+            except queue.Empty:
+                return
+            realizar_download_extrair(alvo)
+            if not _enfileirar(fila_processamento, alvo['periodo'], cancelado):
+                return
+
+    def estagio_download():
+        try:
+            with medir_etapa(manifesto, "coleta"):
+                baixar_cadop()
+                workers = [threading.Thread(target=_proteger(worker_download, erros, cancelado))
+                           for _ in range(max(1, workers_download))]
+                for w in workers: w.start()
+                for w in workers: w.join()
+        finally:
+            _enfileirar(fila_processamento, FIM_FILA, cancelado)
+
+    def estagio_processamento():
+        try:
+            with medir_etapa(manifesto, "processamento") as medicao:
+                while True:
+                    periodo = _desenfileirar(fila_processamento, cancelado)
+                    if periodo is FIM_FILA: break
+                    print(f"[PIPELINE] Processando {periodo}...")
+                    lista_dfs = processar_periodo(periodo, manifesto, usar_particao=usar_particoes)
+                    medicao.linhas_saida = (medicao.linhas_saida or 0) + sum(len(df) for df in lista_dfs)
+                    if not _enfileirar(fila_carga, (periodo, lista_dfs), cancelado):
+                        return
+        finally:
+            _enfileirar(fila_carga, FIM_FILA, cancelado)
+
+    def estagio_carga():
+        # A conexão SQLite pertence à thread que a criou: a carga abre e fecha a sua
+        conexao = abrir_banco_staging(caminho_novo)
+        try:
+            with medir_etapa(manifesto, "carga") as medicao:
+                proximo_id = 0
+                while True:
+                    item = _desenfileirar(fila_carga, cancelado)
+                    if item is FIM_FILA: break
+                    periodo, lista_dfs = item
+                    proximo_id = inserir_pre_agregados(conexao, lista_dfs, proximo_id)
+                    medicao.linhas_entrada = (medicao.linhas_entrada or 0) + sum(len(df) for df in lista_dfs)
+                    print(f"[PIPELINE] {periodo} carregado no staging do banco.")
+        finally:
+            conexao.close()
+
+    caminho_novo = criar_arquivo_construcao(caminho_banco)
+    conexao = None
+    try:
+        threads = [
+            threading.Thread(target=_proteger(estagio, erros, cancelado), name=estagio.__name__)
+            for estagio in (estagio_download, estagio_processamento, estagio_carga)
+        ]
+        for t in threads: t.start()
+        for t in threads: t.join()
+
+        if erros:
+            raise RuntimeError(f"Falha no pipeline sobreposto: {erros[0]}") from erros[0]
+
+        # --- ETAPAS GLOBAIS (dependem de todos os trimestres) ---
+        conexao = conectar_staging(caminho_novo)
+        with medir_etapa(manifesto, "consolidacao"):
+            carregar_cadop_staging(conexao, manifesto)
+            resultado = None
+            if conexao.execute("SELECT COUNT(*) FROM stg_pre_agregado").fetchone()[0]:
+                resultado = consolidar_staging(conexao, manifesto)
+
+        if not resultado:
+            print("[AVISO] Nenhuma linha para gravar. O banco publicado foi mantido.")
+            return resultado
+
+        with medir_etapa(manifesto, "publicacao") as medicao:
+            descartar_staging(conexao)
+            # O staging dispensa fsync; o commit final com sincronização completa torna o arquivo durável
+            conexao.execute("PRAGMA synchronous = FULL")
+            linhas_gravadas = gravar_tabelas_banco(resultado, conexao)
+            conexao.close()
+            conexao = None
+            publicar_banco(caminho_novo, caminho_banco, linhas_gravadas)
+            medicao.linhas_saida = linhas_gravadas
+
         print("\n=== FINALIZADO COM SUCESSO ===")
+        return resultado
+
+    finally:
+        if conexao:
+            conexao.close()
+        remover_arquivo_construcao(caminho_novo)
 
 
-def main():
+def parse_argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline de coleta, processamento e carga dos dados da ANS.")
+    parser.add_argument(
+        "--perfilar", action="store_true",
+        help="Gera um dump do cProfile (.prof) por etapa na pasta 'perfis/'."
+    )
+    parser.add_argument(
+        "--medir-memoria", action="store_true",
+        help="Mede o pico de memória de cada etapa/arquivo via tracemalloc (mais lento; por padrão amostra o RSS)."
+    )
+    parser.add_argument(
+        "--pipeline", action="store_true",
+        help="Sobrepõe download, processamento e carga: cada trimestre é processado assim que termina "
+             "de baixar e carregado no banco em construção assim que termina de ser processado."
+    )
+    parser.add_argument(
+        "--workers-download", type=int, default=2,
+        help="Downloads simultâneos no modo --pipeline (Padrão: 2)."
+    )
+    parser.add_argument(
+        "--backfill", action="store_true",
+        help="Ingere todos os trimestres publicados, reaproveitando as partições (Ano, Trimestre) já processadas."
+    )
+    parser.add_argument(
+        "--motor", choices=["pandas", "sql"], default="pandas",
+        help="Motor do processamento: 'pandas' (em memória) ou 'sql' (out-of-core, via SQLite de staging)."
+    )
+    args = parser.parse_args(argv)
+    if args.motor == "sql" and args.pipeline:
+        parser.error("--pipeline está disponível apenas com --motor pandas.")
+    return args
+
+
+def main(argv=None):
+    args = parse_argumentos(argv)
+    manifesto = ManifestoExecucao(perfilar=args.perfilar, dir_perfis=DIR_PERFIS, medir_memoria=args.medir_memoria)
+    manifesto.parametros = vars(args)
+
     print("=== INICIANDO BUSCADOR DE DADOS ===")
 
+    # Modo backfill: histórico completo, processado e armazenado por partição (Ano, Trimestre)
+    qtd_trimestres = None if args.backfill else 3
+
     try:
-        # COLETA
-        # O Docker vai baixar os arquivos da ANS aqui
-        print("\n>>> [1/3] Iniciando Download dos Dados...")
-        executar_coleta()
+        if args.pipeline:
+            # COLETA + PROCESSAMENTO + CARGA SOBREPOSTOS
+            print("\n>>> [1-3/3] Iniciando Download, Processamento e Carga em Pipeline...")
+            with manifesto.etapa("pipeline") as medicao:
+                resultado_etl = executar_pipeline_sobreposto(
+                    manifesto, workers_download=args.workers_download,
+                    qtd_trimestres=qtd_trimestres, usar_particoes=args.backfill, caminho_banco=DB_PATH
+                )
+                medicao.linhas_entrada = sum(a.linhas_entrada or 0 for a in manifesto.arquivos)
+                medicao.bytes_lidos = sum(a.bytes_lidos or 0 for a in manifesto.arquivos)
+                medicao.linhas_saida = len(resultado_etl["operadoras_despesas"]) if resultado_etl else 0
+        else:
+            # COLETA
+            # O Docker vai baixar os arquivos da ANS aqui
+            print("\n>>> [1/3] Iniciando Download dos Dados...")
+            with manifesto.etapa("coleta") as medicao:
+                bytes_antes = calcular_tamanho_diretorio(DIR_DOWNLOADS)
+                executar_coleta(qtd_trimestres)
+                medicao.bytes_lidos = calcular_tamanho_diretorio(DIR_DOWNLOADS) - bytes_antes
 
-        # PROCESSAMENTO
-        # Lê os arquivos baixados, processa, limpa e gera os CSVs finais
-        print("\n>>> [2/3] Iniciando Processamento...")
-        resultado_etl = executar_etl_financeiro()
+            # PROCESSAMENTO
+            # Lê os arquivos baixados, processa, limpa e gera os CSVs finais
+            print("\n>>> [2/3] Iniciando Processamento...")
+            with manifesto.etapa("processamento") as medicao:
+                if args.motor == "sql":
+                    resultado_etl = executar_etl_financeiro_sql(manifesto, usar_particoes=args.backfill)
+                else:
+                    resultado_etl = executar_etl_financeiro(manifesto, usar_particoes=args.backfill)
+                medicao.linhas_entrada = sum(a.linhas_entrada or 0 for a in manifesto.arquivos)
+                medicao.bytes_lidos = sum(a.bytes_lidos or 0 for a in manifesto.arquivos)
+                medicao.linhas_saida = len(resultado_etl["operadoras_despesas"]) if resultado_etl else 0
 
-        # BANCO DE DADOS
-        # Pega o resultado do ETL e salva no SQLite para a API ler
-        print("\n>>> [3/3] Salvando no Banco de Dados...")
-        persistir_dados_sqlite(resultado_etl)
+            # BANCO DE DADOS
+            # Pega o resultado do ETL e salva no SQLite para a API ler
+            print("\n>>> [3/3] Salvando no Banco de Dados...")
+            with manifesto.etapa("carga") as medicao:
+                medicao.linhas_entrada = len(resultado_etl["operadoras_despesas"]) if resultado_etl else 0
+                medicao.linhas_saida = persistir_dados_sqlite(resultado_etl)
+
+        manifesto.finalizar("sucesso")
 
     except Exception as e:
         print(f"[CRITICAL ERROR] O pipeline foi interrompido: {e}")
+        manifesto.finalizar("erro", e)
         sys.exit(1)
 
+    finally:
+        manifesto.salvar(MANIFESTO_PATH)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,10 +1,22 @@
 import sqlite3
 import os
-from fastapi import FastAPI, HTTPException, Query
+import threading
+import time
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
+from starlette.routing import Match
 from typing import List, Optional, Dict, Any
+from urllib.request import pathname2url
 from pydantic import BaseModel
 
+from src.metricas import (
+    CONTENT_TYPE_PROMETHEUS,
+    LATENCIA_REQUISICOES,
+    executar_consulta_medida,
+    exportar_prometheus,
+)
+
 # --- CONFIGURAÇÃO DA APLICAÇÃO ---
 app = FastAPI(
     title="Intuitive Care API - Monitoramento de Operadoras",
@@ -21,9 +33,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+def identificar_rota(request: Request):
+    """
+    Retorna o template da rota atendida (ex: /api/operadoras/{cnpj}).
+    Rotas internas do Starlette (ex: /docs) não registram a rota no scope, então são resolvidas por match.
+    """
+    rota = request.scope.get("route")
+    if rota is not None:
+        return rota.path
+
+    for candidata in request.app.router.routes:
+        match, _ = candidata.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(candidata, "path", "nao_mapeada")
+    return "nao_mapeada"
+
+
+@app.middleware("http")
+async def medir_latencia_requisicoes(request: Request, call_next):
+    """
+    Registra a latência de cada requisição no histograma por rota.
+    Usa o template da rota (ex: /api/operadoras/{cnpj}) para evitar explosão de cardinalidade.
+    """
+    inicio = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        LATENCIA_REQUISICOES.observar(
+            time.perf_counter() - inicio,
+            method=request.method,
+            route=identificar_rota(request),
+            status=status
+        )
+
+
 # Caminhos absolutos para garantir execução via Docker ou Local
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DB_PATH = os.path.join(BASE_DIR, "intuitive_care.db")
+# A variável INTUITIVE_CARE_DB permite servir outro arquivo (ex: banco sintético de testes de carga)
+DB_PATH = os.getenv("INTUITIVE_CARE_DB", os.path.join(BASE_DIR, "intuitive_care.db"))
 
 
 # --- MODELOS DE DADOS ---
@@ -56,19 +107,102 @@ class Despesa(BaseModel):
 
 
 # --- CAMADA DE ACESSO A DADOS ---
+class ConexoesPorGeracao:
+    """
+    Mantém uma conexão somente leitura por thread, reaproveitada entre requisições.
+
+    O pipeline publica cada geração do banco substituindo o arquivo (os.replace). A troca é
+    detectada pela identidade do arquivo (os.stat) no início de cada requisição, e a conexão
+    da thread é reaberta na nova geração. Requisições em andamento terminam na geração
+    anterior, pois o arquivo substituído continua acessível enquanto houver conexão aberta.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.geracao_atual = None
+
+    def obter(self, caminho):
+        estado = os.stat(caminho)
+        identidade = (caminho, estado.st_ino, estado.st_mtime_ns, estado.st_size)
+        local = self._local
+
+        if getattr(local, "identidade", None) != identidade:
+            anterior = getattr(local, "conexao", None)
+            local.conexao, local.identidade = None, None
+            if anterior is not None:
+                anterior.close()
+
+            conexao = sqlite3.connect(f"file:{pathname2url(os.path.abspath(caminho))}?mode=ro", uri=True)
+            conexao.row_factory = sqlite3.Row
+            geracao = conexao.execute("PRAGMA user_version").fetchone()[0]
+            local.conexao, local.identidade = conexao, identidade
+
+            with self._lock:
+                if geracao != self.geracao_atual:
+                    print(f"[DB] API servindo a geração {geracao} do banco ({caminho}).")
+                    self.geracao_atual = geracao
+
+        return local.conexao
+
+
+CONEXOES = ConexoesPorGeracao()
+
+
 def get_conexao_banco():
     """
-    Estabelece conexão com o banco SQLite.
+    Retorna a conexão da thread com a geração publicada do banco SQLite.
     Configura o row_factory para retornar resultados como dicionários.
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        return conn
-    except sqlite3.Error as e:
+        return CONEXOES.obter(DB_PATH)
+    except (sqlite3.Error, OSError) as e:
         raise HTTPException(status_code=500, detail=f"Erro de conexão com banco de dados: {e}")
 
 
+def executar_consulta(conexao, nome, sql, params=()):
+    """
+    Ponto único de execução de consultas da API.
+    Mede o tempo de cada consulta (rotulada por nome) e registra consultas lentas com o plano de execução.
+
+    Returns:
+        list[sqlite3.Row]: Linhas retornadas pela consulta.
+    """
+    return executar_consulta_medida(conexao, nome, sql, params)
+
+
+# --- FILTRO POR PERÍODO ---
+# Períodos no formato do dataset da ANS (ex: 1T2023). A tabela é clusterizada pela coluna
+# inteira Periodo (Ano * 10 + Trimestre), então filtros por faixa leem apenas os trimestres pedidos.
+PADRAO_PERIODO = r"^[1-4][Tt]\d{4}$"
+
+
+def converter_periodo(periodo):
+    """
+    Converte '1T2023' na chave inteira de particionamento (20231).
+    """
+    trimestre, ano = periodo.upper().split('T')
+    return int(ano) * 10 + int(trimestre)
+
+
+def montar_filtro_periodo(periodo_inicio=None, periodo_fim=None):
+    """
+    Retorna as condições SQL e os parâmetros da faixa de períodos (ambos os limites opcionais).
+    """
+    condicoes, params = [], []
+    if periodo_inicio:
+        condicoes.append("Periodo >= ?")
+        params.append(converter_periodo(periodo_inicio))
+    if periodo_fim:
+        condicoes.append("Periodo <= ?")
+        params.append(converter_periodo(periodo_fim))
+    return condicoes, params
+
+
+def montar_where(condicoes):
+    return (" WHERE " + " AND ".join(condicoes)) if condicoes else ""
+
+
 # --- ROTAS DA API ---
 
 @app.get("/api/operadoras", response_model=PaginacaoResponse, summary="Listar Operadoras")
@@ -77,39 +211,42 @@ def listar_operadoras(
         limit: int = Query(10, ge=1, le=100, description="Itens por página"),
         q: Optional[str] = Query(None, description="Termo de busca"),
         field: str = Query("razao", pattern="^(razao|cnpj|uf|registro|geral)$", description="Campo de filtro"),
-        sort_order: Optional[str] = Query(None, pattern="^(asc|desc)$", description="Ordenação por Total de Despesas")
+        sort_order: Optional[str] = Query(None, pattern="^(asc|desc)$", description="Ordenação por Total de Despesas"),
+        periodo_inicio: Optional[str] = Query(None, pattern=PADRAO_PERIODO, description="Período inicial (ex: 1T2015)"),
+        periodo_fim: Optional[str] = Query(None, pattern=PADRAO_PERIODO, description="Período final (ex: 4T2024)")
 ):
     """
     Retorna uma lista paginada de operadoras com filtros dinâmicos e ordenação.
+    Os totais consideram apenas os trimestres da faixa informada (quando houver).
     """
     offset = (page - 1) * limit
     conexao = get_conexao_banco()
-    cursor = conexao.cursor()
 
     # Construção Dinâmica da Query
-    query_base = "FROM operadoras_despesas"
-    params = []
+    condicoes, params = montar_filtro_periodo(periodo_inicio, periodo_fim)
 
     # Aplicação de Filtros (Busca)
     if q:
         if field == "cnpj":
             # Sanitiza a entrada para buscar apenas números
             q_clean = q.replace('.', '').replace('/', '').replace('-', '')
-            query_base += " WHERE replace(replace(replace(CNPJ, '.', ''), '/', ''), '-', '') LIKE ?"
+            condicoes.append("replace(replace(replace(CNPJ, '.', ''), '/', ''), '-', '') LIKE ?")
             params.append(f"%{q_clean}%")
         elif field == "uf":
-            query_base += " WHERE UF LIKE ?"
+            condicoes.append("UF LIKE ?")
             params.append(f"%{q}%")
         elif field == "registro":
-            query_base += " WHERE Registro_ANS LIKE ?"
+            condicoes.append("Registro_ANS LIKE ?")
             params.append(f"%{q}%")
         elif field == "razao" or field == "geral":
-            query_base += " WHERE Razao_Social LIKE ?"
+            condicoes.append("Razao_Social LIKE ?")
             params.append(f"%{q}%")
 
+    query_base = "FROM operadoras_despesas" + montar_where(condicoes)
+
     # 1. Obter Contagem Total (para a paginação no frontend)
     query_count = f"SELECT COUNT(DISTINCT CNPJ) {query_base}"
-    total_registros = cursor.execute(query_count, params).fetchone()[0]
+    total_registros = executar_consulta(conexao, "listar_operadoras_contagem", query_count, params)[0][0]
 
     # 2. Definir Ordenação
     order_clause = "ORDER BY Razao_Social"  # Ordenação padrão alfabética
@@ -129,8 +266,7 @@ def listar_operadoras(
     """
 
     params.extend([limit, offset])
-    resultados = cursor.execute(query_data, params).fetchall()
-    conexao.close()
+    resultados = executar_consulta(conexao, "listar_operadoras_dados", query_data, params)
 
     # Formatação de Resposta
     dados_formatados = [
@@ -150,30 +286,37 @@ def listar_operadoras(
             "page": page,
             "limit": limit,
             "total": total_registros,
-            "sort": sort_order
+            "sort": sort_order,
+            "periodo_inicio": periodo_inicio,
+            "periodo_fim": periodo_fim
         }
     }
 
 
 @app.get("/api/operadoras/{cnpj}", response_model=OperadoraDetalhes, summary="Detalhes da Operadora")
-def detalhes_operadora(cnpj: str):
+def detalhes_operadora(
+        cnpj: str,
+        periodo_inicio: Optional[str] = Query(None, pattern=PADRAO_PERIODO, description="Período inicial (ex: 1T2015)"),
+        periodo_fim: Optional[str] = Query(None, pattern=PADRAO_PERIODO, description="Período final (ex: 4T2024)")
+):
     """
     Retorna os dados cadastrais completos e o somatório total de despesas de uma operadora específica.
     """
     conexao = get_conexao_banco()
+    condicoes, params = montar_filtro_periodo(periodo_inicio, periodo_fim)
 
-    query = """
+    query = f"""
             SELECT Registro_ANS, CNPJ, Razao_Social, UF, Modalidade, SUM(Total_Despesas) as total_despesas
             FROM operadoras_despesas
-            WHERE CNPJ = ?
+            {montar_where(["CNPJ = ?"] + condicoes)}
             GROUP BY CNPJ \
             """
 
-    row = conexao.execute(query, (cnpj,)).fetchone()
-    conexao.close()
+    linhas = executar_consulta(conexao, "detalhes_operadora", query, [cnpj] + params)
 
-    if not row:
+    if not linhas:
         raise HTTPException(status_code=404, detail="Operadora não encontrada")
+    row = linhas[0]
 
     return {
         "registro_ans": str(row["Registro_ANS"]),
@@ -186,23 +329,28 @@ def detalhes_operadora(cnpj: str):
 
 
 @app.get("/api/operadoras/{cnpj}/despesas", response_model=List[Despesa], summary="Histórico de Despesas")
-def historico_despesas(cnpj: str):
+def historico_despesas(
+        cnpj: str,
+        periodo_inicio: Optional[str] = Query(None, pattern=PADRAO_PERIODO, description="Período inicial (ex: 1T2015)"),
+        periodo_fim: Optional[str] = Query(None, pattern=PADRAO_PERIODO, description="Período final (ex: 4T2024)")
+):
     """
     Retorna a evolução temporal das despesas da operadora, agrupada por Trimestre/Ano.
+    Aceita uma faixa de períodos para análises de tendência sobre o histórico completo.
     """
     conexao = get_conexao_banco()
+    condicoes, params = montar_filtro_periodo(periodo_inicio, periodo_fim)
 
     # O Group By garante a unicidade dos dados temporais
-    query = """
+    query = f"""
             SELECT Trimestre, Ano, Data, SUM(Total_Despesas) as valor
             FROM operadoras_despesas
-            WHERE CNPJ = ?
+            {montar_where(["CNPJ = ?"] + condicoes)}
             GROUP BY Ano, Trimestre, Data
             ORDER BY Ano, Trimestre \
             """
 
-    registros = conexao.execute(query, (cnpj,)).fetchall()
-    conexao.close()
+    registros = executar_consulta(conexao, "historico_despesas", query, [cnpj] + params)
 
     return [
         {
@@ -216,42 +364,58 @@ def historico_despesas(cnpj: str):
 
 
 @app.get("/api/estatisticas", summary="KPIs e Dashboard")
-def obter_estatisticas():
+def obter_estatisticas(
+        periodo_inicio: Optional[str] = Query(None, pattern=PADRAO_PERIODO, description="Período inicial (ex: 1T2015)"),
+        periodo_fim: Optional[str] = Query(None, pattern=PADRAO_PERIODO, description="Período final (ex: 4T2024)")
+):
     """
     Retorna métricas agregadas para o Dashboard:
     - Total Geral de Despesas
     - Média por Trimestre
     - Top 5 Operadoras
     - Top 5 Estados com maiores gastos
+    Todas as métricas respeitam a faixa de períodos informada (quando houver).
     """
     conexao = get_conexao_banco()
-    cursor = conexao.cursor()
+    condicoes, params = montar_filtro_periodo(periodo_inicio, periodo_fim)
+    where = montar_where(condicoes)
 
     # KPIs Gerais
-    total = cursor.execute("SELECT SUM(Total_Despesas) FROM operadoras_despesas").fetchone()[0] or 0
-    media = cursor.execute("SELECT AVG(Total_Despesas) FROM operadoras_despesas").fetchone()[0] or 0
+    total = executar_consulta(
+        conexao, "estatisticas_total", f"SELECT SUM(Total_Despesas) FROM operadoras_despesas{where}", params
+    )[0][0] or 0
+    media = executar_consulta(
+        conexao, "estatisticas_media", f"SELECT AVG(Total_Despesas) FROM operadoras_despesas{where}", params
+    )[0][0] or 0
 
     # Query 1: Top 5 Operadoras com maior volume financeiro
-    top_5_ops = cursor.execute("""
+    top_5_ops = executar_consulta(conexao, "estatisticas_top_operadoras", f"""
                                SELECT Razao_Social as nome, CNPJ as cnpj, SUM(Total_Despesas) as valor
-                               FROM operadoras_despesas
+                               FROM operadoras_despesas{where}
                                GROUP BY CNPJ
                                ORDER BY valor DESC LIMIT 5
-                               """).fetchall()
+                               """, params)
 
     # Query 2: Distribuição Geográfica (Top 5 Estados)
-    uf_stats = cursor.execute("""
+    uf_stats = executar_consulta(conexao, "estatisticas_distribuicao_uf", f"""
                               SELECT UF as nome, SUM(Total_Despesas) as valor
-                              FROM operadoras_despesas
+                              FROM operadoras_despesas{where}
                               GROUP BY UF
                               ORDER BY valor DESC LIMIT 5
-                              """).fetchall()
+                              """, params)
 
-    conexao.close()
 
     return {
         "total_geral": total,
         "media_trimestral": media,
         "top_operadoras": [{"nome": r["nome"], "cnpj": r["cnpj"], "valor": r["valor"]} for r in top_5_ops],
         "distribuicao_uf": [{"nome": r["nome"], "valor": r["valor"]} for r in uf_stats]
-    }
\ No newline at end of file
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+def metricas_prometheus():
+    """
+    Expõe as métricas de latência (rotas e consultas SQL) no formato texto do Prometheus.
+    """
+    return Response(content=exportar_prometheus(), media_type=CONTENT_TYPE_PROMETHEUS)
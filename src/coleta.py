@@ -68,7 +68,8 @@ def identificar_periodos_recentes(qtd_trimestres=3):
     Lógica: Lista anos -> Ordena Decrescente -> Entra no ano -> Busca Trimestres.
 
     Args:
-        qtd_trimestres (int): Quantidade de trimestres a serem coletados (Padrão: 3).
+        qtd_trimestres (int | None): Quantidade de trimestres a serem coletados (Padrão: 3).
+            None coleta todos os trimestres publicados (modo backfill).
 
     Returns:
         list[dict]: Lista de dicionários contendo metadados dos alvos (url, periodo, tipo).
@@ -107,7 +108,7 @@ def identificar_periodos_recentes(qtd_trimestres=3):
             })
 
             # Critério de Parada: Já encontramos a quantidade desejada
-            if len(alvos_coleta) >= qtd_trimestres:
+            if qtd_trimestres is not None and len(alvos_coleta) >= qtd_trimestres:
                 return alvos_coleta
 
     return alvos_coleta
@@ -185,15 +186,18 @@ def baixar_cadop():
         print(f"[ERRO] Exceção ao baixar CADOP: {e}")
 
 
-def executar_coleta():
+def executar_coleta(qtd_trimestres=3):
     """
     Função orquestradora do processo de coleta.
+
+    Args:
+        qtd_trimestres (int | None): Trimestres mais recentes a baixar. None baixa o histórico completo.
     """
     print("=== INICIANDO MÓDULO DE COLETA DE DADOS ===")
     inicializar_estrutura_pastas()
 
     # Identificação e Download dos Dados Financeiros (Demonstrações Contábeis)
-    alvos = identificar_periodos_recentes()
+    alvos = identificar_periodos_recentes(qtd_trimestres)
     print(f"[INFO] Períodos identificados para download: {[a['periodo'] for a in alvos]}")
 
     for alvo in alvos:
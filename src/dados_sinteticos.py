@@ -0,0 +1,194 @@
+import csv
+import os
+import random
+
+# --- CONFIGURAÇÕES DO GERADOR ---
+# Combinações de encoding/separador suportadas por ler_arquivo_csv, alternadas entre os trimestres
+VARIANTES_CSV = [
+    {'encoding': 'utf-8', 'sep': ';'},
+    {'encoding': 'latin1', 'sep': ';'},
+    {'encoding': 'utf-8', 'sep': ','},
+]
+
+# Plano de contas simplificado: (código, descrição). Apenas contas iniciadas em 4 são despesas.
+PLANO_CONTAS = [
+    ('1', 'ATIVO'),
+    ('2', 'PASSIVO'),
+    ('31', 'CONTRAPRESTAÇÕES EFETIVAS DE PLANO DE ASSISTÊNCIA À SAÚDE'),
+    ('311', 'RECEITAS COM OPERAÇÕES DE ASSISTÊNCIA À SAÚDE'),
+    ('41', 'EVENTOS INDENIZÁVEIS LÍQUIDOS / SINISTROS RETIDOS'),
+    ('411', 'EVENTOS CONHECIDOS OU AVISADOS'),
+    ('4111', 'DESPESAS COM EVENTOS / SINISTROS - MÉDICO-HOSPITALAR'),
+    ('46', 'DESPESAS ADMINISTRATIVAS'),
+    ('47', 'DESPESAS FINANCEIRAS'),
+]
+
+MODALIDADES = ['Medicina de Grupo', 'Cooperativa Médica', 'Seguradora Especializada em Saúde',
+               'Autogestão', 'Odontologia de Grupo', 'Filantropia']
+UFS = ['SP', 'RJ', 'MG', 'RS', 'PR', 'SC', 'BA', 'PE', 'CE', 'GO', 'DF', 'ES', 'PA', 'AM']
+PREFIXOS_RAZAO = ['ASSISTÊNCIA MÉDICA', 'SAÚDE', 'UNIMED', 'ODONTO', 'PLANO DE SAÚDE', 'COOPERATIVA']
+SUFIXOS_RAZAO = ['LTDA', 'S.A.', 'COOPERATIVA DE TRABALHO MÉDICO', 'ADMINISTRADORA LTDA']
+
+COLUNAS_DEMONSTRACAO = ['DATA', 'REG_ANS', 'CD_CONTA_CONTABIL', 'DESCRICAO', 'VL_SALDO_INICIAL', 'VL_SALDO_FINAL']
+COLUNAS_CADOP = ['REGISTRO_OPERADORA', 'CNPJ', 'Razao_Social', 'Nome_Fantasia', 'Modalidade',
+                 'Cidade', 'UF', 'Data_Registro_ANS']
+
+
+def calcular_digitos_cnpj(base):
+    """
+    Calcula os dois dígitos verificadores (Módulo 11) para uma base de 12 dígitos.
+    """
+    pesos = [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+    cnpj = base
+    for i in range(12, 14):
+        peso = pesos[1:] if i == 12 else pesos
+        resto = sum(int(a) * b for a, b in zip(cnpj, peso)) % 11
+        cnpj += str(0 if resto < 2 else 11 - resto)
+    return cnpj
+
+
+def gerar_cnpj(rng, valido=True):
+    """
+    Gera um CNPJ de 14 dígitos. Quando valido=False, o último dígito verificador é corrompido.
+    """
+    base = ''.join(str(rng.randint(0, 9)) for _ in range(8)) + '0001'
+    cnpj = calcular_digitos_cnpj(base)
+    if valido:
+        return cnpj
+    return cnpj[:13] + str((int(cnpj[13]) + 1 + rng.randint(0, 8)) % 10)
+
+
+def formatar_valor_monetario(valor, rng):
+    """
+    Formata no padrão brasileiro. Parte dos valores usa separador de milhar ('1.234,56'),
+    como ocorre em arquivos antigos da ANS.
+    """
+    texto = f"{valor:.2f}".replace('.', ',')
+    if rng.random() < 0.3:
+        inteiro, decimal = texto.split(',')
+        negativo = inteiro.startswith('-')
+        inteiro = inteiro.lstrip('-')
+        grupos = []
+        while len(inteiro) > 3:
+            grupos.insert(0, inteiro[-3:])
+            inteiro = inteiro[:-3]
+        grupos.insert(0, inteiro)
+        texto = ('-' if negativo else '') + '.'.join(grupos) + ',' + decimal
+    return texto
+
+
+def gerar_operadoras(rng, qtd_operadoras, proporcao_cnpj_invalido):
+    """
+    Gera o cadastro sintético de operadoras (Registro ANS único de 6 dígitos).
+    """
+    registros = rng.sample(range(300000, 999999), qtd_operadoras)
+    operadoras = []
+    for i, registro in enumerate(registros):
+        nome = f"{rng.choice(PREFIXOS_RAZAO)} {i:05d} {rng.choice(SUFIXOS_RAZAO)}"
+        operadoras.append({
+            'REGISTRO_OPERADORA': str(registro),
+            'CNPJ': gerar_cnpj(rng, valido=rng.random() >= proporcao_cnpj_invalido),
+            'Razao_Social': nome,
+            'Nome_Fantasia': nome.split(' ')[0],
+            'Modalidade': rng.choice(MODALIDADES),
+            'Cidade': 'SÃO PAULO',
+            'UF': rng.choice(UFS),
+            'Data_Registro_ANS': f"{rng.randint(1999, 2020)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+        })
+    return operadoras
+
+
+def escrever_csv(caminho, colunas, linhas, encoding, sep):
+    with open(caminho, 'w', encoding=encoding, newline='') as f:
+        writer = csv.writer(f, delimiter=sep, quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(colunas)
+        writer.writerows(linhas)
+
+
+def gerar_dataset_sintetico(diretorio, qtd_operadoras=100, trimestres=("1T2024", "2T2024", "3T2024"),
+                            linhas_por_operadora=20, proporcao_cnpj_invalido=0.1,
+                            proporcao_sem_cadastro=0.05, variantes=None, semente=42):
+    """
+    Gera um conjunto determinístico de arquivos no mesmo layout da coleta da ANS:
+    <diretorio>/arquivos_extraidos/<trimestre>/<trimestre>.csv e
+    <diretorio>/arquivos_baixados/Relatorio_Cadop.csv.
+
+    Args:
+        diretorio (str): Pasta raiz de saída (equivalente a 'downloads_ans').
+        qtd_operadoras (int): Operadoras presentes nas demonstrações.
+        trimestres (sequence[str]): Pastas de período a gerar (ex: '1T2024').
+        linhas_por_operadora (int): Lançamentos contábeis por operadora em cada trimestre.
+        proporcao_cnpj_invalido (float): Fração de operadoras com dígito verificador incorreto.
+        proporcao_sem_cadastro (float): Fração de operadoras ausentes do CADOP.
+        variantes (list[dict], opcional): Encoding/separador por trimestre (alternados em ciclo).
+        semente (int): Semente do gerador pseudoaleatório.
+
+    Returns:
+        dict: Caminhos gerados e contagens ('dir_extraidos', 'dir_cadop', 'arquivos', 'total_linhas', ...).
+    """
+    rng = random.Random(semente)
+    variantes = variantes or VARIANTES_CSV
+
+    dir_extraidos = os.path.join(diretorio, "arquivos_extraidos")
+    dir_cadop = os.path.join(diretorio, "arquivos_baixados")
+    os.makedirs(dir_cadop, exist_ok=True)
+
+    operadoras = gerar_operadoras(rng, qtd_operadoras, proporcao_cnpj_invalido)
+
+    # CADOP: exclui parte das operadoras para exercitar o Left Join
+    cadastradas = [op for op in operadoras if rng.random() >= proporcao_sem_cadastro]
+    caminho_cadop = os.path.join(dir_cadop, "Relatorio_Cadop.csv")
+    escrever_csv(caminho_cadop, COLUNAS_CADOP, [[op[c] for c in COLUNAS_CADOP] for op in cadastradas], 'utf-8', ';')
+
+    arquivos = []
+    total_linhas = 0
+    for i, trimestre in enumerate(trimestres):
+        variante = variantes[i % len(variantes)]
+        pasta = os.path.join(dir_extraidos, trimestre)
+        os.makedirs(pasta, exist_ok=True)
+
+        num_trimestre, ano = trimestre.upper().split('T')
+        data_ref = f"{ano}-{(int(num_trimestre) - 1) * 3 + 1:02d}-01"
+
+        linhas = []
+        for op in operadoras:
+            for _ in range(linhas_por_operadora):
+                conta, descricao = rng.choice(PLANO_CONTAS)
+                conta = conta + str(rng.randint(0, 9)) * rng.randint(0, 3)
+                saldo_final = rng.uniform(-5_000, 2_000_000)
+                linhas.append([
+                    data_ref, op['REGISTRO_OPERADORA'], conta, descricao,
+                    formatar_valor_monetario(rng.uniform(0, 1_000_000), rng),
+                    formatar_valor_monetario(saldo_final, rng),
+                ])
+
+        caminho = os.path.join(pasta, f"{trimestre}.csv")
+        escrever_csv(caminho, COLUNAS_DEMONSTRACAO, linhas, variante['encoding'], variante['sep'])
+        arquivos.append({'caminho': caminho, 'linhas': len(linhas), **variante})
+        total_linhas += len(linhas)
+
+    return {
+        'dir_raiz': diretorio,
+        'dir_extraidos': dir_extraidos,
+        'dir_cadop': dir_cadop,
+        'arquivos': arquivos,
+        'total_linhas': total_linhas,
+        'qtd_operadoras': qtd_operadoras,
+        'qtd_cadastradas': len(cadastradas),
+        'trimestres': list(trimestres),
+    }
+
+
+def gerar_trimestres(qtd, ano_final=2024):
+    """
+    Gera a lista dos 'qtd' trimestres mais recentes até o 4º trimestre de 'ano_final' (ordem cronológica).
+    """
+    periodos = []
+    ano, trimestre = ano_final, 4
+    for _ in range(qtd):
+        periodos.append(f"{trimestre}T{ano}")
+        trimestre -= 1
+        if trimestre == 0:
+            ano, trimestre = ano - 1, 4
+    return list(reversed(periodos))
+
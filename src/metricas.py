@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+
+# --- CONFIGURAÇÕES DE INSTRUMENTAÇÃO ---
+# Limites superiores (em segundos) dos buckets dos histogramas de latência
+BUCKETS_LATENCIA = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Consultas acima deste tempo (ms) são registradas no log junto com o plano de execução
+LIMIAR_CONSULTA_LENTA_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+CONTENT_TYPE_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escapar_label(valor):
+    """
+    Escapa o valor de um label conforme o formato texto do Prometheus.
+    """
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar_labels(labels):
+    """
+    Converte uma sequência de pares (nome, valor) no bloco {nome="valor",...}.
+    """
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar_label(valor)}"' for nome, valor in labels) + "}"
+
+
+def _formatar_numero(valor):
+    """
+    Formata números no padrão aceito pelo Prometheus (inteiros sem casas decimais).
+    """
+    if valor == float('inf'):
+        return "+Inf"
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+class Histograma:
+    """
+    Histograma cumulativo com labels, seguro para acesso concorrente.
+    Cada combinação de labels mantém seus próprios contadores por bucket.
+    """
+
+    def __init__(self, nome, descricao, labels, buckets=BUCKETS_LATENCIA):
+        self.nome = nome
+        self.descricao = descricao
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **labels):
+        """
+        Registra uma observação (em segundos) para a combinação de labels informada.
+        """
+        chave = tuple(str(labels.get(nome, "")) for nome in self.labels)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = {"buckets": [0] * len(self.buckets), "soma": 0.0, "contagem": 0}
+                self._series[chave] = serie
+
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie["buckets"][i] += 1
+            serie["soma"] += valor
+            serie["contagem"] += 1
+
+    def exportar(self):
+        """
+        Gera as linhas do histograma no formato texto do Prometheus.
+
+        Returns:
+            list[str]: Linhas HELP/TYPE seguidas das séries _bucket, _sum e _count.
+        """
+        linhas = [
+            f"# HELP {self.nome} {self.descricao}",
+            f"# TYPE {self.nome} histogram",
+        ]
+        with self._lock:
+            series = sorted((chave, dict(s, buckets=list(s["buckets"]))) for chave, s in self._series.items())
+
+        for chave, serie in series:
+            base = list(zip(self.labels, chave))
+            for limite, qtd in zip(self.buckets, serie["buckets"]):
+                labels = _formatar_labels(base + [("le", _formatar_numero(limite))])
+                linhas.append(f"{self.nome}_bucket{labels} {qtd}")
+            labels_inf = _formatar_labels(base + [("le", "+Inf")])
+            linhas.append(f"{self.nome}_bucket{labels_inf} {serie['contagem']}")
+            linhas.append(f"{self.nome}_sum{_formatar_labels(base)} {_formatar_numero(serie['soma'])}")
+            linhas.append(f"{self.nome}_count{_formatar_labels(base)} {serie['contagem']}")
+        return linhas
+
+
+class Contador:
+    """
+    Contador monotônico com labels, seguro para acesso concorrente.
+    """
+
+    def __init__(self, nome, descricao, labels):
+        self.nome = nome
+        self.descricao = descricao
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, valor=1, **labels):
+        chave = tuple(str(labels.get(nome, "")) for nome in self.labels)
+        with self._lock:
+            self._series[chave] = self._series.get(chave, 0) + valor
+
+    def exportar(self):
+        linhas = [
+            f"# HELP {self.nome} {self.descricao}",
+            f"# TYPE {self.nome} counter",
+        ]
+        with self._lock:
+            series = sorted(self._series.items())
+        for chave, valor in series:
+            linhas.append(f"{self.nome}{_formatar_labels(list(zip(self.labels, chave)))} {_formatar_numero(valor)}")
+        return linhas
+
+
+# --- MÉTRICAS EXPOSTAS PELA API ---
+LATENCIA_REQUISICOES = Histograma(
+    "http_request_duration_seconds",
+    "Latencia das requisicoes HTTP por rota.",
+    labels=["method", "route", "status"],
+)
+
+LATENCIA_CONSULTAS = Histograma(
+    "db_query_duration_seconds",
+    "Tempo de execucao (incluindo fetch) das consultas SQL por nome.",
+    labels=["query"],
+)
+
+CONSULTAS_LENTAS = Contador(
+    "db_slow_queries_total",
+    "Quantidade de consultas acima do limiar SLOW_QUERY_MS.",
+    labels=["query"],
+)
+
+REGISTRO_METRICAS = [LATENCIA_REQUISICOES, LATENCIA_CONSULTAS, CONSULTAS_LENTAS]
+
+
+def registrar_consulta_lenta(conexao, nome, sql, params, duracao):
+    """
+    Registra no log uma consulta lenta, incluindo o resultado do EXPLAIN QUERY PLAN.
+    Falhas ao obter o plano não interrompem a requisição original.
+    """
+    CONSULTAS_LENTAS.incrementar(query=nome)
+    print(f"[SLOW QUERY] {nome} levou {duracao * 1000:.1f} ms (limiar: {LIMIAR_CONSULTA_LENTA_MS:.0f} ms)")
+    try:
+        plano = conexao.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        for linha in plano:
+            print(f"   [PLANO] {linha[-1]}")
+    except Exception as e:
+        print(f"   [AVISO] Não foi possível obter o plano de execução: {e}")
+
+
+def executar_consulta_medida(conexao, nome, sql, params=()):
+    """
+    Executa uma consulta SQL medindo o tempo total (execução + fetch).
+
+    Args:
+        conexao (sqlite3.Connection): Conexão aberta com o banco.
+        nome (str): Identificador estável da consulta (usado como label da métrica).
+        sql (str): Comando SQL parametrizado.
+        params (sequence): Parâmetros do comando.
+
+    Returns:
+        list: Todas as linhas retornadas pela consulta.
+    """
+    inicio = time.perf_counter()
+    linhas = conexao.execute(sql, params).fetchall()
+    duracao = time.perf_counter() - inicio
+
+    LATENCIA_CONSULTAS.observar(duracao, query=nome)
+    if duracao * 1000 >= LIMIAR_CONSULTA_LENTA_MS:
+        registrar_consulta_lenta(conexao, nome, sql, params, duracao)
+    return linhas
+
+
+def exportar_prometheus():
+    """
+    Serializa todas as métricas registradas no formato texto do Prometheus.
+    """
+    linhas = []
+    for metrica in REGISTRO_METRICAS:
+        linhas.extend(metrica.exportar())
+    return "\n".join(linhas) + "\n"
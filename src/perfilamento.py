@@ -0,0 +1,359 @@
+import cProfile
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows não possui o módulo resource
+    resource = None
+
+try:
+    import psutil
+except ImportError:  # Opcional: usado apenas onde /proc não existe (macOS, Windows)
+    psutil = None
+
+# Intervalo entre amostras do RSS atual durante uma medição
+INTERVALO_AMOSTRAGEM_RSS_S = 0.01
+
+
+def ler_rss_maximo():
+    """
+    Pico de memória residente (RSS) do processo até o momento, em bytes (None no Windows).
+    """
+    if resource is None:
+        return None
+    # ru_maxrss é reportado em KB no Linux e em bytes no macOS
+    fator = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * fator
+
+
+def ler_rss_atual():
+    """
+    Memória residente (RSS) atual do processo, em bytes (None se não houver como medir).
+    Lê /proc/self/statm no Linux e recorre ao psutil, quando instalado, nas demais plataformas.
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return None
+
+
+class AmostradorRSS:
+    """
+    Amostra o RSS atual do processo em uma thread leve enquanto um bloco executa,
+    guardando o valor inicial e o maior valor observado.
+    O RSS é do processo inteiro: no modo pipeline inclui a memória das etapas concorrentes.
+    """
+
+    def __init__(self, intervalo=INTERVALO_AMOSTRAGEM_RSS_S):
+        self.intervalo = intervalo
+        self.inicio = None
+        self.pico = None
+        self._parar = threading.Event()
+        self._thread = None
+
+    def _amostrar(self):
+        rss = ler_rss_atual()
+        if rss is not None and rss > self.pico:
+            self.pico = rss
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            self._amostrar()
+
+    def iniciar(self):
+        self.inicio = ler_rss_atual()
+        if self.inicio is None:
+            return
+        self.pico = self.inicio
+        self._thread = threading.Thread(target=self._executar, name="amostrador-rss", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        if self._thread is None:
+            return
+        self._parar.set()
+        self._thread.join()
+        # Última amostra cobre blocos mais curtos que o intervalo de amostragem
+        self._amostrar()
+
+
+class Medicao:
+    """
+    Resultado da medição de uma etapa do pipeline ou de um arquivo de entrada.
+    Os contadores de volume (linhas/bytes) são preenchidos pelo código medido.
+    """
+
+    def __init__(self, tipo, nome):
+        self.tipo = tipo
+        self.nome = nome
+        self.linhas_entrada = None
+        self.linhas_saida = None
+        self.bytes_lidos = None
+        self.tempo_parede_s = None
+        self.tempo_cpu_s = None
+        self.pico_memoria_bytes = None
+        self.rss_inicio_bytes = None
+        self.rss_pico_bytes = None
+        self.arquivo_perfil = None
+        self._pico_parcial = 0
+
+    @property
+    def rss_crescimento_bytes(self):
+        """
+        Quanto o RSS do processo cresceu durante a medição (pico - início).
+        """
+        if self.rss_inicio_bytes is None or self.rss_pico_bytes is None:
+            return None
+        return self.rss_pico_bytes - self.rss_inicio_bytes
+
+    def para_dict(self):
+        dados = {
+            "tipo": self.tipo,
+            "nome": self.nome,
+            "tempo_parede_s": round(self.tempo_parede_s, 6) if self.tempo_parede_s is not None else None,
+            "tempo_cpu_s": round(self.tempo_cpu_s, 6) if self.tempo_cpu_s is not None else None,
+            "linhas_entrada": self.linhas_entrada,
+            "linhas_saida": self.linhas_saida,
+            "bytes_lidos": self.bytes_lidos,
+            "pico_memoria_bytes": self.pico_memoria_bytes,
+            "rss_inicio_bytes": self.rss_inicio_bytes,
+            "rss_pico_bytes": self.rss_pico_bytes,
+            "rss_crescimento_bytes": self.rss_crescimento_bytes,
+        }
+        if self.arquivo_perfil:
+            dados["arquivo_perfil"] = self.arquivo_perfil
+        return dados
+
+
+class ManifestoExecucao:
+    """
+    Coleta as métricas de custo de uma execução do pipeline (tempo, CPU, volume e memória)
+    e as serializa em um manifesto JSON legível por máquina.
+
+    Por padrão, a memória de cada medição é acompanhada pelo RSS atual do processo, amostrado em
+    uma thread leve: RSS no início, pico durante a medição e o crescimento entre os dois (custo
+    desprezível). O RSS máximo do processo inteiro (ru_maxrss) é registrado uma única vez, no nível
+    da execução. Com medir_memoria=True, o pico de cada medição também é medido via
+    tracemalloc, que é mais preciso porém torna o pipeline algumas vezes mais lento e, portanto,
+    distorce os tempos registrados. Medições aninhadas (ex: arquivo dentro da etapa de
+    processamento) propagam seu pico para as medições externas antes de reiniciar o contador.
+    """
+
+    def __init__(self, perfilar=False, dir_perfis=None, medir_memoria=False):
+        self.id_execucao = datetime.now().strftime("%Y%m%dT%H%M%S")
+        self.inicio = datetime.now().isoformat(timespec="seconds")
+        self.fim = None
+        self.status = "em_andamento"
+        self.erro = None
+        self.parametros = {}
+        self.perfilar = perfilar
+        self.dir_perfis = dir_perfis
+        self.medir_memoria = medir_memoria
+        self.etapas = []
+        self.arquivos = []
+        self._pilha = []
+        # Perfil cProfile em andamento por thread (ident -> arquivo .prof da etapa que o abriu)
+        self._perfis_ativos = {}
+        self._lock = threading.Lock()
+
+        if self.medir_memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    # --- MEMÓRIA ---
+    def _capturar_pico(self):
+        """
+        Propaga o pico atual para todas as medições ativas e reinicia o contador do tracemalloc.
+        """
+        if not tracemalloc.is_tracing():
+            return
+        _, pico = tracemalloc.get_traced_memory()
+        for medicao in self._pilha:
+            medicao._pico_parcial = max(medicao._pico_parcial, pico)
+        tracemalloc.reset_peak()
+
+    # --- MEDIÇÃO ---
+    def medir(self, tipo, nome):
+        """
+        Retorna um context manager que mede a execução do bloco.
+
+        Args:
+            tipo (str): 'etapa' (estágio do pipeline) ou 'arquivo' (arquivo de entrada).
+            nome (str): Nome da etapa ou caminho do arquivo.
+        """
+        return _ContextoMedicao(self, tipo, nome)
+
+    def etapa(self, nome):
+        return self.medir("etapa", nome)
+
+    def arquivo(self, caminho):
+        contexto = self.medir("arquivo", caminho)
+        if os.path.exists(caminho):
+            contexto.medicao.bytes_lidos = os.path.getsize(caminho)
+        return contexto
+
+    def _registrar(self, medicao):
+        with self._lock:
+            if medicao.tipo == "arquivo":
+                self.arquivos.append(medicao)
+            else:
+                self.etapas.append(medicao)
+
+    # --- SERIALIZAÇÃO ---
+    def finalizar(self, status="sucesso", erro=None):
+        self.fim = datetime.now().isoformat(timespec="seconds")
+        self.status = status
+        self.erro = str(erro) if erro else None
+
+    def para_dict(self):
+        return {
+            "id_execucao": self.id_execucao,
+            "inicio": self.inicio,
+            "fim": self.fim,
+            "status": self.status,
+            "erro": self.erro,
+            "parametros": self.parametros,
+            "ambiente": {
+                "python": platform.python_version(),
+                "plataforma": platform.platform(),
+                "cpus": os.cpu_count(),
+            },
+            "rss_maximo_bytes": ler_rss_maximo(),
+            "etapas": [m.para_dict() for m in self.etapas],
+            "arquivos": [m.para_dict() for m in self.arquivos],
+        }
+
+    def salvar(self, caminho):
+        """
+        Grava o manifesto em JSON e acrescenta uma linha ao histórico (.jsonl) ao lado,
+        permitindo acompanhar a tendência de custo entre execuções.
+        """
+        dados = self.para_dict()
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(dados, f, ensure_ascii=False, indent=2)
+
+        caminho_historico = os.path.splitext(caminho)[0] + "_historico.jsonl"
+        with open(caminho_historico, "a", encoding="utf-8") as f:
+            f.write(json.dumps(dados, ensure_ascii=False) + "\n")
+
+        print(f"[MANIFESTO] Métricas da execução salvas em: {caminho}")
+
+
+class _ContextoMedicao:
+    """
+    Context manager que efetivamente coleta tempo de parede, CPU, memória e (opcionalmente) cProfile.
+    """
+
+    def __init__(self, manifesto, tipo, nome):
+        self.manifesto = manifesto
+        self.medicao = Medicao(tipo, nome)
+        self._perfil = None
+
+    def __enter__(self):
+        manifesto = self.manifesto
+        with manifesto._lock:
+            manifesto._capturar_pico()
+            manifesto._pilha.append(self.medicao)
+
+        # Iniciado fora do cProfile para que a thread de amostragem não apareça no perfil da etapa
+        self._amostrador = AmostradorRSS()
+        self._amostrador.iniciar()
+
+        # cProfile só é ativado nas etapas e não suporta perfis aninhados: um segundo enable() na
+        # mesma thread interromperia o perfil externo (Python 3.11) ou falharia (3.12+). A etapa
+        # interna fica contida no perfil da etapa externa e aponta para o mesmo arquivo.
+        if manifesto.perfilar and self.medicao.tipo == "etapa":
+            thread = threading.get_ident()
+            perfil_externo = manifesto._perfis_ativos.get(thread)
+            if perfil_externo is not None:
+                self.medicao.arquivo_perfil = perfil_externo
+            else:
+                self._perfil = cProfile.Profile()
+                try:
+                    self._perfil.enable()
+                except ValueError:
+                    # Outro profiler já ativo (ex: etapas concorrentes no modo pipeline em Python 3.12+)
+                    print(f"[AVISO] cProfile indisponível para a etapa '{self.medicao.nome}' (outro perfil ativo).")
+                    self._perfil = None
+                else:
+                    self.medicao.arquivo_perfil = self._caminho_perfil()
+                    manifesto._perfis_ativos[thread] = self.medicao.arquivo_perfil
+
+        # Em threads auxiliares (modo pipeline) mede-se a CPU da própria thread,
+        # pois o tempo de CPU do processo misturaria as etapas concorrentes.
+        self._relogio_cpu = time.process_time if threading.current_thread() is threading.main_thread() \
+            else time.thread_time
+        self._inicio_parede = time.perf_counter()
+        self._inicio_cpu = self._relogio_cpu()
+        return self.medicao
+
+    def __exit__(self, exc_type, exc, tb):
+        medicao = self.medicao
+        medicao.tempo_parede_s = time.perf_counter() - self._inicio_parede
+        medicao.tempo_cpu_s = self._relogio_cpu() - self._inicio_cpu
+
+        if self._perfil is not None:
+            self._perfil.disable()
+            self.manifesto._perfis_ativos.pop(threading.get_ident(), None)
+            self._salvar_perfil()
+
+        self._amostrador.parar()
+        medicao.rss_inicio_bytes = self._amostrador.inicio
+        medicao.rss_pico_bytes = self._amostrador.pico
+
+        manifesto = self.manifesto
+        with manifesto._lock:
+            manifesto._capturar_pico()
+            manifesto._pilha.remove(medicao)
+        if tracemalloc.is_tracing():
+            medicao.pico_memoria_bytes = medicao._pico_parcial
+
+        manifesto._registrar(medicao)
+        return False
+
+    def _caminho_perfil(self):
+        dir_perfis = self.manifesto.dir_perfis or "perfis"
+        nome_seguro = "".join(c if c.isalnum() else "_" for c in self.medicao.nome)
+        return os.path.join(dir_perfis, f"{self.manifesto.id_execucao}_{nome_seguro}.prof")
+
+    def _salvar_perfil(self):
+        caminho = self.medicao.arquivo_perfil
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        self._perfil.dump_stats(caminho)
+        print(f"[PERFIL] cProfile da etapa '{self.medicao.nome}' salvo em: {caminho}")
+
+
+class _MedicaoNula:
+    """
+    Substituto usado quando nenhum manifesto é informado: aceita os mesmos atributos e não mede nada.
+    """
+
+    def __enter__(self):
+        return Medicao("nula", "")
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+def medir_arquivo(manifesto, caminho):
+    """
+    Atalho para medir um arquivo de entrada quando o manifesto é opcional.
+    """
+    return manifesto.arquivo(caminho) if manifesto is not None else _MedicaoNula()
+
+
+def medir_etapa(manifesto, nome):
+    """
+    Atalho para medir uma etapa quando o manifesto é opcional.
+    """
+    return manifesto.etapa(nome) if manifesto is not None else _MedicaoNula()
@@ -4,6 +4,8 @@ import glob
 import zipfile
 import re
 
+from src.perfilamento import medir_arquivo
+
 # --- CONSTANTES E CONFIGURAÇÕES DO AMBIENTE ---
 DIRETORIO_SRC = os.path.dirname(os.path.abspath(__file__))
 DIRETORIO_RAIZ = os.path.dirname(DIRETORIO_SRC)
@@ -12,6 +14,13 @@ PATH_ENTRADA_BRUTA = os.path.join(DIRETORIO_RAIZ, "downloads_ans", "arquivos_ext
 PATH_ENTRADA_CADOP = os.path.join(DIRETORIO_RAIZ, "downloads_ans", "arquivos_baixados")
 PATH_SAIDA_PROCESSADA = os.path.join(DIRETORIO_RAIZ, "planilhas_processadas")
 
+# Ordem de tentativa de separador/encoding na leitura dos CSVs da ANS
+CONFIGS_LEITURA_CSV = [
+    {'sep': ';', 'encoding': 'utf-8'},
+    {'sep': ';', 'encoding': 'latin1'},
+    {'sep': ',', 'encoding': 'utf-8'}
+]
+
 
 def inicializar_diretorios():
     """
@@ -84,12 +93,7 @@ def ler_arquivo_csv(caminho_arquivo):
     Tenta ler um arquivo CSV utilizando diferentes encodings e separadores.
     Estratégia de Fallback: Tenta UTF-8 (padrão novo) -> Latin1 (padrão antigo).
     """
-    configs = [
-        {'sep': ';', 'encoding': 'utf-8'},
-        {'sep': ';', 'encoding': 'latin1'},
-        {'sep': ',', 'encoding': 'utf-8'}
-    ]
-    for cfg in configs:
+    for cfg in CONFIGS_LEITURA_CSV:
         try:
             df = pd.read_csv(caminho_arquivo, sep=cfg['sep'], encoding=cfg['encoding'], dtype=str)
             if len(df.columns) > 1: return df
@@ -164,7 +168,14 @@ def gerar_relatorio_agregado_2_3(df_detalhado):
 
     # Ordenação por volume de despesas (Decrescente)
     df_agg = df_agg.sort_values(by='Total_Despesas', ascending=False)
+    exportar_relatorio_agregado_2_3(df_agg)
 
+
+def exportar_relatorio_agregado_2_3(df_agg):
+    """
+    Exporta o agregado do Requisito 2.3 (já ordenado por Total_Despesas) em .zip.
+    Compartilhado entre o motor pandas e o motor SQL (processamento_sql).
+    """
     print(
         f"   [INFO] Agregação concluída. Top 1: {df_agg.iloc[0]['RazaoSocial']} (R$ {df_agg.iloc[0]['Total_Despesas']:,.2f})")
 
@@ -181,58 +192,243 @@ def gerar_relatorio_agregado_2_3(df_detalhado):
     )
 
 
-def executar_etl_financeiro():
+# Nomes aceitos para as colunas-chave das Demonstrações Contábeis (variações de layout da ANS)
+COLUNAS_REGISTRO = ['REG_ANS', 'CD_OPERADORA', 'REGISTRO_OPERADORA']
+COLUNAS_CONTA = ['CD_CONTA', 'CD_CONTA_CONTABIL', 'CONTA']
+COLUNAS_VALOR = ['VL_SALDO_FINAL', 'VALOR', 'SALDO']
+
+
+def inferir_trimestre_ano(nome_pasta):
+    """
+    Inferência de Data baseada na estrutura de pastas (ex: '1T2023' -> ('1T', '2023')).
+    """
+    try:
+        return nome_pasta.upper().split('T')[0] + 'T', nome_pasta.upper().split('T')[1]
+    except:
+        return 'ND', 'ND'
+
+
+def preprocessar_arquivo_demonstracao(arquivo, medicao=None):
+    """
+    Lê um arquivo de Demonstrações Contábeis, filtra as contas de despesa e pré-agrega
+    os valores por Operadora/Trimestre/Ano.
+
+    Args:
+        arquivo (str): Caminho do CSV, dentro de uma pasta de trimestre (ex: .../1T2023/arquivo.csv).
+        medicao (Medicao, opcional): Recebe a contagem de linhas lidas e geradas.
+
+    Returns:
+        pd.DataFrame | None: Pré-agregado do arquivo, ou None se o arquivo não for aplicável.
+    """
+    nome_pasta = os.path.basename(os.path.dirname(arquivo))
+    # Filtra apenas pastas de Trimestres (ex: 1T2023)
+    if 'T' not in nome_pasta.upper(): return None
+
+    df = ler_arquivo_csv(arquivo)
+    if medicao is not None: medicao.linhas_entrada = len(df)
+    if df.empty: return None
+    df.columns = [c.strip().upper() for c in df.columns]
+
+    # Identificação de colunas chaves
+    col_reg = next((c for c in df.columns if c in COLUNAS_REGISTRO), None)
+    col_conta = next((c for c in df.columns if c in COLUNAS_CONTA), None)
+    col_valor = next((c for c in df.columns if c in COLUNAS_VALOR), None)
+
+    if not (col_reg and col_conta and col_valor): return None
+
+    # Filtro: Apenas contas de DESPESAS (iniciadas em 4)
+    df_filtrado = df[df[col_conta].str.startswith('4', na=False)].copy()
+    if df_filtrado.empty: return None
+
+    temp = pd.DataFrame()
+    temp['PK_Registro_ANS'] = df_filtrado[col_reg].apply(sanitizar_id_ans)
+
+    # Inferência de Data baseada na estrutura de pastas
+    temp['Trimestre'], temp['Ano'] = inferir_trimestre_ano(nome_pasta)
+
+    temp['ValorDespesas'] = df_filtrado[col_valor].apply(converter_valor_monetario)
+
+    # Pré-agregação para reduzir consumo de memória antes do Merge
+    temp_agrupado = temp.groupby(['PK_Registro_ANS', 'Trimestre', 'Ano'])['ValorDespesas'].sum().reset_index()
+    if medicao is not None: medicao.linhas_saida = len(temp_agrupado)
+    print(f"   [OK] Processado: {os.path.basename(arquivo)}")
+    return temp_agrupado
+
+
+def listar_arquivos_demonstracoes(diretorio):
+    """
+    Lista recursivamente os CSVs (extensão em minúsculas ou maiúsculas) de um diretório.
+    """
+    return glob.glob(os.path.join(diretorio, "**", "*.csv"), recursive=True) + \
+           glob.glob(os.path.join(diretorio, "**", "*.CSV"), recursive=True)
+
+
+def carregar_cadop_medido(manifesto=None):
+    """
+    Carrega o CADOP registrando sua leitura no manifesto (quando informado).
+    """
+    with medir_arquivo(manifesto, os.path.join(PATH_ENTRADA_CADOP, "Relatorio_Cadop.csv")) as medicao:
+        df_cadastro = carregar_dados_cadastrais()
+        medicao.linhas_saida = len(df_cadastro)
+    return df_cadastro
+
+
+def caminho_particao(periodo):
+    """
+    Caminho do pré-agregado particionado de um trimestre, no layout
+    PATH_SAIDA_PROCESSADA/particoes/ano=YYYY/trimestre=NT/pre_agregado.csv.gz.
+    """
+    match = re.fullmatch(r'([1-4])T(\d{4})', periodo.upper())
+    subpasta = os.path.join(f"ano={match.group(2)}", f"trimestre={match.group(1)}T") if match \
+        else f"periodo={periodo}"
+    return os.path.join(PATH_SAIDA_PROCESSADA, "particoes", subpasta, "pre_agregado.csv.gz")
+
+
+def particao_atualizada(caminho, arquivos_origem):
+    """
+    Uma partição é reaproveitável se existir e for mais recente que todos os arquivos de origem.
+    """
+    if not os.path.exists(caminho) or not arquivos_origem: return False
+    return os.path.getmtime(caminho) >= max(os.path.getmtime(a) for a in arquivos_origem)
+
+
+def gravar_particao(caminho, lista_dfs):
+    """
+    Grava o pré-agregado do trimestre (inclusive vazio, para não reprocessar) de forma atômica.
+    """
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    df = pd.concat(lista_dfs, ignore_index=True) if lista_dfs else \
+        pd.DataFrame(columns=['PK_Registro_ANS', 'Trimestre', 'Ano', 'ValorDespesas'])
+    caminho_tmp = caminho + ".tmp"
+    df.to_csv(caminho_tmp, index=False, compression='gzip')
+    os.replace(caminho_tmp, caminho)
+
+
+def ler_particao(caminho):
+    df = pd.read_csv(
+        caminho, compression='gzip', keep_default_na=False,
+        dtype={'PK_Registro_ANS': str, 'Trimestre': str, 'Ano': str, 'ValorDespesas': float}
+    )
+    return [df] if not df.empty else []
+
+
+def processar_periodo(periodo, manifesto=None, usar_particao=False):
+    """
+    Pré-processa todos os arquivos de um único trimestre (pasta PATH_ENTRADA_BRUTA/<periodo>).
+    Permite processar cada trimestre assim que seu download termina.
+
+    Args:
+        periodo (str): Nome da pasta do trimestre (ex: '1T2023').
+        manifesto (ManifestoExecucao, opcional): Registra as métricas de cada arquivo.
+        usar_particao (bool): Reaproveita o pré-agregado particionado por (Ano, Trimestre) quando
+            ele for mais recente que os arquivos de origem; caso contrário, reprocessa e o atualiza.
+
+    Returns:
+        list[pd.DataFrame]: Pré-agregados dos arquivos aplicáveis do período.
+    """
+    arquivos = listar_arquivos_demonstracoes(os.path.join(PATH_ENTRADA_BRUTA, periodo))
+
+    if usar_particao:
+        caminho = caminho_particao(periodo)
+        if particao_atualizada(caminho, arquivos):
+            print(f"   [CACHE] Partição de {periodo} reaproveitada.")
+            return ler_particao(caminho)
+
+    lista_dfs = []
+    for arquivo in arquivos:
+        with medir_arquivo(manifesto, arquivo) as medicao:
+            temp_agrupado = preprocessar_arquivo_demonstracao(arquivo, medicao)
+        if temp_agrupado is not None:
+            lista_dfs.append(temp_agrupado)
+
+    if usar_particao and arquivos:
+        gravar_particao(caminho, lista_dfs)
+    return lista_dfs
+
+
+def listar_periodos_extraidos():
+    """
+    Lista as pastas de trimestre disponíveis em PATH_ENTRADA_BRUTA (ordem cronológica).
+    """
+    if not os.path.isdir(PATH_ENTRADA_BRUTA): return []
+    periodos = [p for p in os.listdir(PATH_ENTRADA_BRUTA) if os.path.isdir(os.path.join(PATH_ENTRADA_BRUTA, p))]
+
+    def ordem(periodo):
+        match = re.fullmatch(r'([1-4])T(\d{4})', periodo.upper())
+        return (int(match.group(2)), int(match.group(1))) if match else (0, 0)
+
+    return sorted(periodos, key=lambda p: (ordem(p), p))
+
+
+def adicionar_chave_periodo(df):
+    """
+    Cria a coluna inteira 'Periodo' (Ano * 10 + Trimestre, ex: 1T/2023 -> 20231),
+    usada como chave de particionamento/clusterização no banco. Períodos inválidos recebem 0.
+    """
+    num_trimestre = pd.to_numeric(df['Trimestre'].str.extract(r'^([1-4])T$', expand=False), errors='coerce')
+    ano = pd.to_numeric(df['Ano'].where(df['Ano'].str.fullmatch(r'\d{4}', na=False)), errors='coerce')
+    df['Periodo'] = (ano * 10 + num_trimestre).fillna(0).astype('int64')
+    return df
+
+
+def executar_etl_financeiro(manifesto=None, usar_particoes=False):
     """
     Função Principal do Pipeline (Extract, Transform, Load).
     Coordena a leitura, limpeza, enriquecimento e validação dos dados.
+
+    Args:
+        manifesto (ManifestoExecucao, opcional): Quando informado, registra tempo, CPU,
+            volume e pico de memória de cada arquivo de entrada.
+        usar_particoes (bool): Processa trimestre a trimestre, reaproveitando os pré-agregados
+            particionados por (Ano, Trimestre) que já estejam atualizados (modo backfill).
     """
     inicializar_diretorios()
-    df_cadastro = carregar_dados_cadastrais()
+    df_cadastro = carregar_cadop_medido(manifesto)
 
     print("\n--- INICIANDO PROCESSAMENTO FINANCEIRO ---")
-    arquivos = glob.glob(os.path.join(PATH_ENTRADA_BRUTA, "**", "*.csv"), recursive=True) + \
-               glob.glob(os.path.join(PATH_ENTRADA_BRUTA, "**", "*.CSV"), recursive=True)
-
     lista_dfs = []
 
+    if usar_particoes:
+        for periodo in listar_periodos_extraidos():
+            lista_dfs.extend(processar_periodo(periodo, manifesto, usar_particao=True))
+        return consolidar_despesas(lista_dfs, df_cadastro)
+
+    arquivos = listar_arquivos_demonstracoes(PATH_ENTRADA_BRUTA)
+
     # --- EXTRAÇÃO E PRÉ-PROCESSAMENTO ---
     for arquivo in arquivos:
-        nome_pasta = os.path.basename(os.path.dirname(arquivo))
-        # Filtra apenas pastas de Trimestres (ex: 1T2023)
-        if 'T' not in nome_pasta.upper(): continue
-
-        df = ler_arquivo_csv(arquivo)
-        if df.empty: continue
-        df.columns = [c.strip().upper() for c in df.columns]
-
-        # Identificação de colunas chaves
-        col_reg = next((c for c in df.columns if c in ['REG_ANS', 'CD_OPERADORA', 'REGISTRO_OPERADORA']), None)
-        col_conta = next((c for c in df.columns if c in ['CD_CONTA', 'CD_CONTA_CONTABIL', 'CONTA']), None)
-        col_valor = next((c for c in df.columns if c in ['VL_SALDO_FINAL', 'VALOR', 'SALDO']), None)
-
-        if col_reg and col_conta and col_valor:
-            # Filtro: Apenas contas de DESPESAS (iniciadas em 4)
-            df_filtrado = df[df[col_conta].str.startswith('4', na=False)].copy()
-            if df_filtrado.empty: continue
-
-            temp = pd.DataFrame()
-            temp['PK_Registro_ANS'] = df_filtrado[col_reg].apply(sanitizar_id_ans)
-
-            # Inferência de Data baseada na estrutura de pastas
-            try:
-                temp['Trimestre'] = nome_pasta.upper().split('T')[0] + 'T'
-                temp['Ano'] = nome_pasta.upper().split('T')[1]
-            except:
-                temp['Trimestre'] = 'ND';
-                temp['Ano'] = 'ND'
-
-            temp['ValorDespesas'] = df_filtrado[col_valor].apply(converter_valor_monetario)
-
-            # Pré-agregação para reduzir consumo de memória antes do Merge
-            temp_agrupado = temp.groupby(['PK_Registro_ANS', 'Trimestre', 'Ano'])['ValorDespesas'].sum().reset_index()
+        with medir_arquivo(manifesto, arquivo) as medicao:
+            temp_agrupado = preprocessar_arquivo_demonstracao(arquivo, medicao)
+        if temp_agrupado is not None:
             lista_dfs.append(temp_agrupado)
-            print(f"   [OK] Processado: {os.path.basename(arquivo)}")
 
+    return consolidar_despesas(lista_dfs, df_cadastro)
+
+
+def exportar_consolidado(df_validos):
+    """
+    Exporta o consolidado detalhado (registros validados, antes da deduplicação) em .zip.
+    """
+    caminho_cons = gerenciar_conflito_arquivo(PATH_SAIDA_PROCESSADA, "consolidado_despesas", ".zip")
+    df_validos[['CNPJ', 'RazaoSocial', 'Trimestre', 'Ano', 'ValorDespesas']].to_csv(
+        caminho_cons, index=False, sep=';', encoding='utf-8-sig',
+        compression=dict(method='zip', archive_name='consolidado_despesas.csv')
+    )
+    print(f"[EXPORT] Consolidado Detalhado: {caminho_cons}")
+
+
+def consolidar_despesas(lista_dfs, df_cadastro):
+    """
+    Etapas que dependem de todos os trimestres: Join com o CADOP, validação de CNPJ,
+    relatórios exportados (2.3 e consolidado) e deduplicação para o banco.
+
+    Args:
+        lista_dfs (list[pd.DataFrame]): Pré-agregados por Operadora/Trimestre/Ano.
+        df_cadastro (pd.DataFrame): Saída de carregar_dados_cadastrais.
+
+    Returns:
+        dict | None: Tabelas prontas para persistência, ou None se não houver dados.
+    """
     if not lista_dfs: return None
 
     df_consolidado = pd.concat(lista_dfs, ignore_index=True)
@@ -258,12 +454,7 @@ def executar_etl_financeiro():
     # Geração dos relatórios solicitados
     gerar_relatorio_agregado_2_3(df_validos)
 
-    caminho_cons = gerenciar_conflito_arquivo(PATH_SAIDA_PROCESSADA, "consolidado_despesas", ".zip")
-    df_validos[['CNPJ', 'RazaoSocial', 'Trimestre', 'Ano', 'ValorDespesas']].to_csv(
-        caminho_cons, index=False, sep=';', encoding='utf-8-sig',
-        compression=dict(method='zip', archive_name='consolidado_despesas.csv')
-    )
-    print(f"[EXPORT] Consolidado Detalhado: {caminho_cons}")
+    exportar_consolidado(df_validos)
 
     # --- PREPARAÇÃO PARA BANCO DE DADOS ---
     df_banco = df_validos.rename(
@@ -271,6 +462,7 @@ def executar_etl_financeiro():
 
     if not df_banco.empty:
         df_banco['Data'] = df_banco['Trimestre'] + '/' + df_banco['Ano']
+        df_banco = adicionar_chave_periodo(df_banco)
 
         # Ordenação para garantir determinismo no drop_duplicates
         df_banco = df_banco.sort_values(by=['Registro_ANS', 'Ano', 'Trimestre'])
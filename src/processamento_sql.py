@@ -0,0 +1,431 @@
+import math
+import os
+import re
+import sqlite3
+
+import pandas as pd
+
+from src import processamento
+from src.perfilamento import medir_arquivo, medir_etapa
+
+# --- CONFIGURAÇÕES DO MOTOR SQL (OUT-OF-CORE) ---
+# Linhas lidas por lote de cada CSV bruto: limita a memória usada na ingestão
+TAMANHO_LOTE_PADRAO = 50_000
+# Cache de páginas do SQLite de staging; ordenações/agrupamentos maiores que isso vão para disco
+CACHE_STAGING_MB = 64
+
+SQL_ESQUEMA_STAGING = """
+CREATE TABLE stg_arquivos (
+    arquivo_id INTEGER PRIMARY KEY,
+    caminho TEXT,
+    Trimestre TEXT,
+    Ano TEXT
+);
+CREATE TABLE stg_lancamentos (
+    arquivo_id INTEGER,
+    reg TEXT,
+    conta TEXT,
+    valor TEXT
+);
+CREATE TABLE stg_cadop (
+    PK_Registro_ANS TEXT PRIMARY KEY,
+    CNPJ TEXT,
+    RazaoSocial TEXT,
+    Modalidade TEXT,
+    UF TEXT
+) WITHOUT ROWID;
+CREATE TABLE stg_pre_agregado (
+    arquivo_id INTEGER,
+    PK_Registro_ANS TEXT,
+    Trimestre TEXT,
+    Ano TEXT,
+    ValorDespesas REAL,
+    PRIMARY KEY (arquivo_id, PK_Registro_ANS)
+) WITHOUT ROWID;
+"""
+
+# Filtro de contas de DESPESAS (iniciadas em 4) como faixa, equivalente a str.startswith('4')
+SQL_PRE_AGREGACAO = """
+INSERT INTO stg_pre_agregado (arquivo_id, PK_Registro_ANS, Trimestre, Ano, ValorDespesas)
+SELECT l.arquivo_id, sanitizar_id_ans(l.reg) AS pk, a.Trimestre, a.Ano,
+       SUM(converter_valor_monetario(l.valor))
+FROM stg_lancamentos l
+JOIN stg_arquivos a ON a.arquivo_id = l.arquivo_id
+WHERE l.conta >= '4' AND l.conta < '5'
+GROUP BY l.arquivo_id, pk
+"""
+
+# Pré-agregado de um trimestre no formato das partições do backfill (mesma ordem do pd.concat)
+SQL_PARTICAO = """
+SELECT PK_Registro_ANS, Trimestre, Ano, ValorDespesas
+FROM stg_pre_agregado
+WHERE arquivo_id >= ?
+ORDER BY arquivo_id, PK_Registro_ANS
+"""
+
+# Join com o CADOP + validação de CNPJ. Registros sem cadastro ficam sem CNPJ e seriam
+# descartados pela validação de qualquer forma, por isso o Inner Join equivale ao Left Join do pandas.
+SQL_VALIDACAO = """
+CREATE TABLE stg_validos AS
+SELECT p.arquivo_id, p.PK_Registro_ANS, p.Trimestre, p.Ano, p.ValorDespesas, c.CNPJ,
+       COALESCE(c.RazaoSocial, 'DESCONHECIDA') AS RazaoSocial,
+       COALESCE(c.Modalidade, 'ND') AS Modalidade,
+       COALESCE(c.UF, 'BR') AS UF,
+       limpar_cnpj(c.CNPJ) AS CNPJ_Limpo
+FROM stg_pre_agregado p
+JOIN stg_cadop c ON c.PK_Registro_ANS = p.PK_Registro_ANS
+WHERE validar_digitos_cnpj(c.CNPJ)
+"""
+
+SQL_INDICES_VALIDOS = """
+CREATE INDEX idx_stg_validos_chave ON stg_validos (PK_Registro_ANS, Ano, Trimestre, arquivo_id);
+CREATE INDEX idx_stg_validos_operadora_uf ON stg_validos (RazaoSocial, UF);
+"""
+
+SQL_AGREGADO_2_3 = """
+SELECT RazaoSocial, UF,
+       SUM(ValorDespesas) AS Total_Despesas,
+       AVG(ValorDespesas) AS Media_Trimestral,
+       desvio_padrao(ValorDespesas) AS Desvio_Padrao
+FROM stg_validos
+GROUP BY RazaoSocial, UF
+ORDER BY Total_Despesas DESC
+"""
+
+# Mesma ordem do pd.concat dos pré-agregados: arquivo a arquivo, operadoras ordenadas pelo groupby
+SQL_CONSOLIDADO = """
+SELECT CNPJ, RazaoSocial, Trimestre, Ano, ValorDespesas
+FROM stg_validos
+ORDER BY arquivo_id, PK_Registro_ANS
+"""
+
+# Deduplicação: mantém o registro do primeiro arquivo lido, como o drop_duplicates(keep='first')
+SQL_TABELA_BANCO = """
+SELECT PK_Registro_ANS AS Registro_ANS, Trimestre, Ano, ValorDespesas AS Total_Despesas, CNPJ,
+       RazaoSocial AS Razao_Social, Modalidade, UF, CNPJ_Limpo, Trimestre || '/' || Ano AS Data
+FROM (
+    SELECT *, ROW_NUMBER() OVER (
+        PARTITION BY PK_Registro_ANS, Ano, Trimestre ORDER BY arquivo_id
+    ) AS ordem
+    FROM stg_validos
+)
+WHERE ordem = 1
+ORDER BY Registro_ANS, Ano, Trimestre
+"""
+
+
+class DesvioPadraoAmostral:
+    """
+    Agregação SQL do desvio padrão amostral (ddof=1, como o pandas), pelo algoritmo de Welford.
+    Grupos com um único registro retornam 0.0 (equivalente ao fillna(0.0) do relatório 2.3).
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.media = 0.0
+        self.m2 = 0.0
+
+    def step(self, valor):
+        if valor is None: return
+        self.n += 1
+        delta = valor - self.media
+        self.media += delta / self.n
+        self.m2 += delta * (valor - self.media)
+
+    def finalize(self):
+        if self.n < 2: return 0.0
+        return math.sqrt(self.m2 / (self.n - 1))
+
+
+def limpar_cnpj(cnpj):
+    return re.sub(r'\D', '', str(cnpj))
+
+
+def conectar_staging(caminho, cache_mb=CACHE_STAGING_MB):
+    """
+    Abre um banco de staging já criado e registra as funções Python usadas pelo SQL.
+
+    O banco é descartável: sem fsync e com journal em memória (necessário apenas para
+    desfazer um arquivo lido com o encoding errado).
+    """
+    conexao = sqlite3.connect(caminho, isolation_level=None)
+    conexao.execute("PRAGMA journal_mode = MEMORY")
+    conexao.execute("PRAGMA synchronous = OFF")
+    conexao.execute("PRAGMA temp_store = FILE")
+    conexao.execute(f"PRAGMA cache_size = -{int(cache_mb * 1024)}")
+
+    # Mesmas regras de limpeza/validação do motor pandas
+    conexao.create_function("sanitizar_id_ans", 1, processamento.sanitizar_id_ans, deterministic=True)
+    conexao.create_function("converter_valor_monetario", 1, processamento.converter_valor_monetario,
+                            deterministic=True)
+    conexao.create_function("validar_digitos_cnpj", 1, processamento.validar_digitos_cnpj, deterministic=True)
+    conexao.create_function("limpar_cnpj", 1, limpar_cnpj, deterministic=True)
+    conexao.create_aggregate("desvio_padrao", 1, DesvioPadraoAmostral)
+    return conexao
+
+
+def abrir_banco_staging(caminho, cache_mb=CACHE_STAGING_MB):
+    """
+    Cria (do zero) o banco SQLite de staging, com as tabelas stg_*.
+    """
+    for sufixo in ("", "-journal"):
+        if os.path.exists(caminho + sufixo): os.remove(caminho + sufixo)
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+
+    conexao = conectar_staging(caminho, cache_mb)
+    conexao.executescript(SQL_ESQUEMA_STAGING)
+    return conexao
+
+
+def descartar_staging(conexao):
+    """
+    Remove as tabelas stg_* (usado quando o staging fica dentro do banco que será publicado).
+    """
+    tabelas = [linha[0] for linha in conexao.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'stg!_%' ESCAPE '!'")]
+    for tabela in tabelas:
+        conexao.execute(f'DROP TABLE "{tabela}"')
+
+
+def carregar_cadop_staging(conexao, manifesto=None):
+    """
+    Carrega o CADOP (tabela pequena, ~1 mil operadoras) na tabela indexada stg_cadop.
+    """
+    df_cadastro = processamento.carregar_cadop_medido(manifesto)
+    if df_cadastro.empty: return 0
+
+    registros = df_cadastro.astype(object).where(df_cadastro.notna(), None)
+    conexao.execute("BEGIN")
+    conexao.executemany("INSERT INTO stg_cadop VALUES (?, ?, ?, ?, ?)",
+                        registros.itertuples(index=False, name=None))
+    conexao.execute("COMMIT")
+    return len(df_cadastro)
+
+
+def _inserir_lotes(conexao, arquivo_id, caminho, cfg, tamanho_lote, medicao):
+    """
+    Lê o CSV em lotes com um separador/encoding e insere as colunas-chave em stg_lancamentos.
+
+    Returns:
+        bool | None: True se carregado, None se o layout não tiver as colunas-chave.
+            Erros de leitura são propagados para que o chamador tente a próxima configuração.
+    """
+    cabecalho = pd.read_csv(caminho, sep=cfg['sep'], encoding=cfg['encoding'], dtype=str, nrows=0)
+    if len(cabecalho.columns) <= 1:
+        raise ValueError("separador incompatível")
+
+    # Normalização de colunas para Upper Case, mantendo o nome original para o usecols
+    originais = {c.strip().upper(): c for c in cabecalho.columns}
+    col_reg = next((originais[c] for c in originais if c in processamento.COLUNAS_REGISTRO), None)
+    col_conta = next((originais[c] for c in originais if c in processamento.COLUNAS_CONTA), None)
+    col_valor = next((originais[c] for c in originais if c in processamento.COLUNAS_VALOR), None)
+    if not (col_reg and col_conta and col_valor): return None
+
+    leitor = pd.read_csv(caminho, sep=cfg['sep'], encoding=cfg['encoding'], dtype=str,
+                         usecols=[col_reg, col_conta, col_valor], chunksize=tamanho_lote)
+    for lote in leitor:
+        lote = lote[[col_reg, col_conta, col_valor]]
+        lote = lote.astype(object).where(lote.notna(), None)
+        conexao.executemany(
+            "INSERT INTO stg_lancamentos (arquivo_id, reg, conta, valor) VALUES (?, ?, ?, ?)",
+            ((arquivo_id, reg, conta, valor) for reg, conta, valor in lote.itertuples(index=False, name=None))
+        )
+        if medicao is not None: medicao.linhas_entrada = (medicao.linhas_entrada or 0) + len(lote)
+    return True
+
+
+def carregar_arquivo_staging(conexao, arquivo_id, caminho, tamanho_lote=TAMANHO_LOTE_PADRAO, medicao=None):
+    """
+    Ingere um arquivo de Demonstrações Contábeis no staging sem carregá-lo inteiro em memória.
+
+    Segue o mesmo fallback de ler_arquivo_csv: cada configuração de separador/encoding é tentada
+    dentro de uma transação, desfeita se a leitura falhar no meio do arquivo.
+
+    Returns:
+        bool: True se o arquivo foi carregado no staging.
+    """
+    nome_pasta = os.path.basename(os.path.dirname(caminho))
+    # Filtra apenas pastas de Trimestres (ex: 1T2023)
+    if 'T' not in nome_pasta.upper(): return False
+
+    for cfg in processamento.CONFIGS_LEITURA_CSV:
+        conexao.execute("BEGIN")
+        try:
+            carregado = _inserir_lotes(conexao, arquivo_id, caminho, cfg, tamanho_lote, medicao)
+        except Exception:
+            conexao.execute("ROLLBACK")
+            if medicao is not None: medicao.linhas_entrada = None
+            continue
+
+        if not carregado:
+            conexao.execute("ROLLBACK")
+            return False
+
+        trimestre, ano = processamento.inferir_trimestre_ano(nome_pasta)
+        conexao.execute("INSERT INTO stg_arquivos VALUES (?, ?, ?, ?)", (arquivo_id, caminho, trimestre, ano))
+        conexao.execute("COMMIT")
+        print(f"   [OK] Carregado no staging: {os.path.basename(caminho)}")
+        return True
+    return False
+
+
+def inserir_pre_agregados(conexao, lista_dfs, proximo_id):
+    """
+    Insere em stg_pre_agregado pré-agregados já calculados (partições ou saída do motor pandas).
+
+    Cada linha recebe seu próprio arquivo_id: a ordem dos DataFrames (arquivo a arquivo) é preservada
+    para o consolidado e para a deduplicação, e uma operadora presente em mais de um arquivo do
+    trimestre não colide na chave primária.
+
+    Returns:
+        int: Próximo arquivo_id livre.
+    """
+    for df in lista_dfs:
+        conexao.execute("BEGIN")
+        conexao.executemany(
+            "INSERT INTO stg_pre_agregado (arquivo_id, PK_Registro_ANS, Trimestre, Ano, ValorDespesas) "
+            "VALUES (?, ?, ?, ?, ?)",
+            ((proximo_id + i, pk, trimestre, ano, valor) for i, (pk, trimestre, ano, valor) in
+             enumerate(df[['PK_Registro_ANS', 'Trimestre', 'Ano', 'ValorDespesas']].itertuples(index=False, name=None)))
+        )
+        conexao.execute("COMMIT")
+        proximo_id += len(df)
+    return proximo_id
+
+
+def carregar_particao_staging(conexao, caminho, proximo_id):
+    """
+    Insere em stg_pre_agregado o pré-agregado particionado de um trimestre, sem reler os CSVs brutos.
+
+    Returns:
+        int: Próximo arquivo_id livre.
+    """
+    return inserir_pre_agregados(conexao, processamento.ler_particao(caminho), proximo_id)
+
+
+def carregar_periodo_staging(conexao, periodo, proximo_id, manifesto=None, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Modo backfill: leva ao staging o pré-agregado de um trimestre, reaproveitando a partição
+    (Ano, Trimestre) quando ela for mais recente que os arquivos de origem. Caso contrário, os CSVs
+    do trimestre são ingeridos e pré-agregados, e a partição é regravada (no mesmo formato do motor
+    pandas, de modo que os dois motores reaproveitam as partições um do outro).
+
+    Returns:
+        int: Próximo arquivo_id livre.
+    """
+    arquivos = processamento.listar_arquivos_demonstracoes(os.path.join(processamento.PATH_ENTRADA_BRUTA, periodo))
+    caminho = processamento.caminho_particao(periodo)
+    if processamento.particao_atualizada(caminho, arquivos):
+        print(f"   [CACHE] Partição de {periodo} reaproveitada.")
+        return carregar_particao_staging(conexao, caminho, proximo_id)
+
+    primeiro_id = proximo_id
+    for arquivo in arquivos:
+        with medir_arquivo(manifesto, arquivo) as medicao:
+            carregar_arquivo_staging(conexao, proximo_id, arquivo, tamanho_lote, medicao)
+        proximo_id += 1
+
+    conexao.execute(SQL_PRE_AGREGACAO)
+    conexao.execute("DELETE FROM stg_lancamentos")
+    if arquivos:
+        processamento.gravar_particao(caminho, [pd.read_sql_query(SQL_PARTICAO, conexao, params=(primeiro_id,))])
+    return proximo_id
+
+
+def consolidar_staging(conexao, manifesto=None):
+    """
+    Etapas globais do motor SQL sobre stg_pre_agregado e stg_cadop já carregados: Join com o CADOP
+    e validação, relatórios (2.3 e consolidado) e deduplicação para o banco.
+
+    Returns:
+        dict | None: Mesmas tabelas de executar_etl_financeiro.
+    """
+    # --- ENRIQUECIMENTO (JOIN) E VALIDAÇÃO ---
+    with medir_etapa(manifesto, "sql_validacao") as medicao:
+        conexao.execute(SQL_VALIDACAO)
+        conexao.executescript(SQL_INDICES_VALIDOS)
+        total_validos = conexao.execute("SELECT COUNT(*) FROM stg_validos").fetchone()[0]
+        medicao.linhas_saida = total_validos
+    print(f"[INFO] Registros Validados: {total_validos}")
+
+    # --- RELATÓRIOS ---
+    print("\nGerando Relatório Agregado...")
+    with medir_etapa(manifesto, "sql_agregado_2_3"):
+        df_agg = pd.read_sql_query(SQL_AGREGADO_2_3, conexao)
+    if df_agg.empty:
+        print("[AVISO] Dataset vazio, pulando agregação.")
+    else:
+        processamento.exportar_relatorio_agregado_2_3(df_agg)
+
+    processamento.exportar_consolidado(pd.read_sql_query(SQL_CONSOLIDADO, conexao))
+
+    # --- PREPARAÇÃO PARA BANCO DE DADOS ---
+    with medir_etapa(manifesto, "sql_deduplicacao") as medicao:
+        df_banco = pd.read_sql_query(SQL_TABELA_BANCO, conexao)
+        medicao.linhas_saida = len(df_banco)
+    df_banco = processamento.adicionar_chave_periodo(df_banco)
+
+    registros_removidos = total_validos - len(df_banco)
+    if registros_removidos > 0:
+        print(f"   [FIX] Deduplicação aplicada: {registros_removidos} registros redundantes removidos.")
+
+    return {"operadoras_despesas": df_banco, "historico_despesas": df_banco}
+
+
+def executar_etl_financeiro_sql(manifesto=None, caminho_staging=None, tamanho_lote=TAMANHO_LOTE_PADRAO,
+                                cache_mb=CACHE_STAGING_MB, manter_staging=False, usar_particoes=False):
+    """
+    Alternativa out-of-core a executar_etl_financeiro: os CSVs brutos são transferidos em lotes
+    para um SQLite de staging e o filtro de contas, a pré-agregação, o Join com o CADOP,
+    a deduplicação e as estatísticas do 2.3 são executados em SQL indexado.
+
+    O consumo de memória fica limitado ao lote de leitura e ao cache do SQLite (o excedente
+    das ordenações vai para disco). Apenas as saídas, que são do tamanho de operadoras x
+    trimestres, voltam para o pandas, reaproveitando as mesmas rotinas de exportação.
+
+    Args:
+        manifesto (ManifestoExecucao, opcional): Registra as métricas de cada arquivo e etapa SQL.
+        caminho_staging (str, opcional): Banco de staging (Padrão: PATH_SAIDA_PROCESSADA/staging_etl.db).
+        tamanho_lote (int): Linhas por lote na leitura dos CSVs.
+        cache_mb (int): Cache de páginas do SQLite de staging, em MB.
+        manter_staging (bool): Mantém o banco de staging ao final (útil para depuração).
+        usar_particoes (bool): Processa trimestre a trimestre, reaproveitando os pré-agregados
+            particionados por (Ano, Trimestre) que já estejam atualizados (modo backfill).
+
+    Returns:
+        dict | None: Mesmas tabelas de executar_etl_financeiro, ou None se não houver dados.
+    """
+    processamento.inicializar_diretorios()
+    caminho_staging = caminho_staging or os.path.join(processamento.PATH_SAIDA_PROCESSADA, "staging_etl.db")
+    conexao = abrir_banco_staging(caminho_staging, cache_mb)
+
+    try:
+        carregar_cadop_staging(conexao, manifesto)
+
+        print("\n--- INICIANDO PROCESSAMENTO FINANCEIRO (MOTOR SQL) ---")
+        # --- EXTRAÇÃO (STREAMING PARA O STAGING) ---
+        if usar_particoes:
+            # Cada trimestre é pré-agregado (ou lido da partição) antes do próximo ser ingerido
+            proximo_id = 0
+            for periodo in processamento.listar_periodos_extraidos():
+                proximo_id = carregar_periodo_staging(conexao, periodo, proximo_id, manifesto, tamanho_lote)
+        else:
+            arquivos = processamento.listar_arquivos_demonstracoes(processamento.PATH_ENTRADA_BRUTA)
+            for arquivo_id, arquivo in enumerate(arquivos):
+                with medir_arquivo(manifesto, arquivo) as medicao:
+                    carregar_arquivo_staging(conexao, arquivo_id, arquivo, tamanho_lote, medicao)
+
+        # --- PRÉ-AGREGAÇÃO ---
+        with medir_etapa(manifesto, "sql_pre_agregacao") as medicao:
+            conexao.execute(SQL_PRE_AGREGACAO)
+            # Os lançamentos brutos não são mais necessários: libera o espaço do staging
+            conexao.execute("DELETE FROM stg_lancamentos")
+            medicao.linhas_saida = conexao.execute("SELECT COUNT(*) FROM stg_pre_agregado").fetchone()[0]
+        if medicao.linhas_saida == 0: return None
+
+        return consolidar_staging(conexao, manifesto)
+
+    finally:
+        conexao.close()
+        if not manter_staging and os.path.exists(caminho_staging):
+            os.remove(caminho_staging)
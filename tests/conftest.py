@@ -0,0 +1,23 @@
+import pytest
+
+from benchmarks.apoio_sintetico import construir_banco_sintetico, redirecionar_caminhos_etl
+from src import api
+from src.dados_sinteticos import gerar_dataset_sintetico, gerar_trimestres
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    """Gera um dataset sintético pequeno (30 operadoras x 4 trimestres) e aponta o ETL para ele"""
+    dados = gerar_dataset_sintetico(str(tmp_path / "downloads_ans"), qtd_operadoras=30,
+                                    trimestres=gerar_trimestres(4), linhas_por_operadora=10)
+    with redirecionar_caminhos_etl(dados, str(tmp_path / "saida")):
+        yield dados
+
+
+@pytest.fixture
+def banco_sintetico(tmp_path, monkeypatch):
+    """Publica um banco sintético (200 operadoras x 8 trimestres) e aponta a API para ele"""
+    banco = str(tmp_path / "sintetico.db")
+    construir_banco_sintetico(banco, qtd_operadoras=200, qtd_trimestres=8)
+    monkeypatch.setattr(api, "DB_PATH", banco)
+    return banco
@@ -1,4 +1,11 @@
+import os
+import re
+import sqlite3
+
 from fastapi.testclient import TestClient
+from benchmarks.apoio_sintetico import construir_banco_sintetico
+from main import INDICES_COBERTURA
+from src import api, metricas
 from src.api import app
 
 client = TestClient(app)
@@ -33,4 +40,98 @@ def test_estatisticas():
     assert response.status_code == 200
     data = response.json()
     assert "total_geral" in data
-    assert "top_operadoras" in data
\ No newline at end of file
+    assert "top_operadoras" in data
+
+def test_metricas_prometheus(banco_sintetico, monkeypatch, capsys):
+    """Testa se o endpoint /metrics expõe as latências por rota e por consulta, e o log de consultas lentas"""
+    # Limiar zero: toda consulta é tratada como lenta e tem o plano registrado no log
+    monkeypatch.setattr(metricas, "LIMIAR_CONSULTA_LENTA_MS", 0)
+    capsys.readouterr()
+    assert client.get("/api/estatisticas").status_code == 200
+    log = capsys.readouterr().out
+    assert "[SLOW QUERY] estatisticas_top_operadoras" in log
+    assert "[PLANO]" in log
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE http_request_duration_seconds histogram" in response.text
+    assert 'route="/api/estatisticas"' in response.text
+    assert "# TYPE db_query_duration_seconds histogram" in response.text
+    assert 'db_query_duration_seconds_count{query="estatisticas_top_operadoras"}' in response.text
+    assert "# TYPE db_slow_queries_total counter" in response.text
+    assert 'db_slow_queries_total{query="estatisticas_top_operadoras"}' in response.text
+
+
+def test_filtro_periodo(banco_sintetico):
+    """Testa se a faixa de períodos restringe histórico e totais (banco sintético)"""
+    cnpj = client.get("/api/operadoras?limit=1").json()["data"][0]["cnpj"]
+    historico = client.get(f"/api/operadoras/{cnpj}/despesas?periodo_inicio=3T2024&periodo_fim=4T2024").json()
+    assert historico and {h["data_referencia"] for h in historico} <= {"3T/2024", "4T/2024"}
+
+    total = client.get("/api/estatisticas").json()["total_geral"]
+    parcial = client.get("/api/estatisticas?periodo_inicio=4T2024").json()["total_geral"]
+    assert 0 < parcial < total
+
+    assert client.get("/api/operadoras?periodo_inicio=5T2024").status_code == 422
+
+
+def test_consultas_usam_indices(banco_sintetico, monkeypatch):
+    """Testa via EXPLAIN QUERY PLAN se nenhuma consulta das rotas varre a tabela sem índice"""
+    consultas = {}
+    executar_original = api.executar_consulta
+
+    def registrar_consulta(conexao, nome, sql, params=()):
+        consultas.setdefault(nome, []).append((sql, list(params)))
+        return executar_original(conexao, nome, sql, params)
+
+    monkeypatch.setattr(api, "executar_consulta", registrar_consulta)
+
+    cnpj = client.get("/api/operadoras?limit=1").json()["data"][0]["cnpj"]
+    faixa = "periodo_inicio=2T2023&periodo_fim=3T2024"
+    for url in ["/api/operadoras?sort_order=desc", f"/api/operadoras?{faixa}&q=SA&field=razao",
+                "/api/operadoras?q=12&field=cnpj&sort_order=asc", f"/api/operadoras/{cnpj}",
+                f"/api/operadoras/{cnpj}?{faixa}", f"/api/operadoras/{cnpj}/despesas",
+                f"/api/operadoras/{cnpj}/despesas?{faixa}", "/api/estatisticas", f"/api/estatisticas?{faixa}"]:
+        assert client.get(url).status_code == 200
+
+    assert len(consultas) == 8
+    indices_usados = set()
+    conexao = sqlite3.connect(banco_sintetico)
+    for nome, execucoes in consultas.items():
+        for sql, params in execucoes:
+            plano = [linha[3] for linha in conexao.execute("EXPLAIN QUERY PLAN " + sql, params)]
+            acessos = [p for p in plano if "operadoras_despesas" in p]
+            assert acessos, f"{nome}: {plano}"
+            for acesso in acessos:
+                assert acesso.startswith("SEARCH") or "USING" in acesso and "INDEX" in acesso, f"{nome}: {plano}"
+                indices_usados.update(re.findall(r"INDEX (\w+)", acesso))
+            # Consultas por CNPJ devem continuar O(log n) com o crescimento do histórico
+            if nome in ("detalhes_operadora", "historico_despesas"):
+                assert any("INDEX idx_operadoras_despesas_cnpj (CNPJ=?" in p for p in acessos), f"{nome}: {plano}"
+    conexao.close()
+
+    # Todo índice criado na carga precisa servir a alguma rota (senão só encarece a carga)
+    assert set(INDICES_COBERTURA["operadoras_despesas"]) <= indices_usados, indices_usados
+
+
+def test_troca_atomica_do_banco(banco_sintetico):
+    """Testa se uma nova geração do banco é servida sem interromper a leitura em andamento"""
+    total_anterior = client.get("/api/operadoras").json()["meta"]["total"]
+
+    # Leitura em andamento na geração 1
+    conexao = api.get_conexao_banco()
+    cursor = conexao.execute("SELECT CNPJ FROM operadoras_despesas")
+    primeira = cursor.fetchone()
+    assert conexao.execute("PRAGMA user_version").fetchone()[0] == 1
+
+    construir_banco_sintetico(banco_sintetico, qtd_operadoras=260, qtd_trimestres=8, semente=7)
+    assert not [nome for nome in os.listdir(os.path.dirname(banco_sintetico)) if nome.endswith(".novo")]
+
+    # A leitura iniciada termina na geração anterior
+    assert primeira is not None and len(cursor.fetchall()) > 0
+
+    nova = api.get_conexao_banco()
+    assert nova is not conexao
+    assert nova.execute("PRAGMA user_version").fetchone()[0] == 2
+    assert client.get("/api/operadoras").json()["meta"]["total"] > total_anterior
@@ -0,0 +1,25 @@
+import pytest
+
+from src.perfilamento import ManifestoExecucao, ler_rss_atual
+
+
+@pytest.mark.skipif(ler_rss_atual() is None, reason="RSS atual indisponível nesta plataforma")
+def test_rss_por_medicao():
+    """Testa se o RSS de cada medição reflete apenas a memória alocada durante ela"""
+    manifesto = ManifestoExecucao()
+    tamanho = 64 * 1024 ** 2
+
+    with manifesto.arquivo("grande.csv"):
+        bloco = bytearray(tamanho)
+        bloco[::4096] = b"x" * len(bloco[::4096])  # Toca cada página para que entre no RSS
+        del bloco
+    with manifesto.arquivo("pequeno.csv"):
+        pass
+
+    grande, pequeno = manifesto.arquivos
+    assert grande.rss_crescimento_bytes >= tamanho * 0.9
+    assert grande.rss_pico_bytes >= grande.rss_inicio_bytes + tamanho * 0.9
+    # Ao contrário do ru_maxrss, a medição seguinte não herda o pico da anterior
+    assert pequeno.rss_crescimento_bytes < tamanho / 4
+    assert pequeno.rss_pico_bytes < grande.rss_pico_bytes
+    assert set(pequeno.para_dict()) >= {"rss_inicio_bytes", "rss_pico_bytes", "rss_crescimento_bytes"}
@@ -0,0 +1,214 @@
+import json
+import os
+import pstats
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import main
+from src import processamento
+
+
+@pytest.fixture
+def dataset(dataset, monkeypatch):
+    """Dataset sintético já 'baixado': os downloads do pipeline viram no-ops"""
+    monkeypatch.setattr(main, "inicializar_estrutura_pastas", lambda: None)
+    monkeypatch.setattr(main, "baixar_cadop", lambda: None)
+    monkeypatch.setattr(main, "identificar_periodos_recentes",
+                        lambda qtd=None: [{"periodo": p, "url_origem": "", "is_zip": True} for p in dataset["trimestres"]])
+    monkeypatch.setattr(main, "realizar_download_extrair", lambda alvo: None)
+    return dataset
+
+
+def _ordenar(df):
+    return df.sort_values(["Registro_ANS", "Ano", "Trimestre"]).reset_index(drop=True)
+
+
+def test_pipeline_equivalente_ao_sequencial(dataset, tmp_path):
+    """Testa se o modo pipeline produz e publica a mesma tabela do ETL sequencial"""
+    banco = str(tmp_path / "pipeline.db")
+    sequencial = processamento.executar_etl_financeiro()["operadoras_despesas"]
+    sobreposto = main.executar_pipeline_sobreposto(workers_download=3, tamanho_fila=1,
+                                                   caminho_banco=banco)["operadoras_despesas"]
+    pd.testing.assert_frame_equal(_ordenar(sequencial), _ordenar(sobreposto[sequencial.columns]))
+
+    conexao = sqlite3.connect(banco)
+    publicado = pd.read_sql_query("SELECT * FROM operadoras_despesas", conexao)
+    tabelas = {linha[0] for linha in conexao.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conexao.close()
+    pd.testing.assert_frame_equal(_ordenar(publicado[sequencial.columns]), _ordenar(sequencial), check_dtype=False)
+    assert not any(nome.startswith("stg_") for nome in tabelas)
+    assert main.ler_geracao_banco(banco) == 1
+
+
+def test_pipeline_sobrepoe_estagios(dataset, tmp_path, monkeypatch):
+    """Testa se o processamento e a carga começam antes de terminarem os downloads"""
+    carregado = threading.Event()
+    inserir_original = main.inserir_pre_agregados
+
+    def inserir_e_sinalizar(*args):
+        proximo_id = inserir_original(*args)
+        carregado.set()
+        return proximo_id
+
+    def download_do_ultimo_aguarda_carga(alvo):
+        # Sem sobreposição, o último download esperaria uma carga que só começa depois dele
+        if alvo["periodo"] == dataset["trimestres"][-1]:
+            assert carregado.wait(timeout=10), "nenhum trimestre carregado antes do fim dos downloads"
+
+    monkeypatch.setattr(main, "inserir_pre_agregados", inserir_e_sinalizar)
+    monkeypatch.setattr(main, "realizar_download_extrair", download_do_ultimo_aguarda_carga)
+    assert main.executar_pipeline_sobreposto(workers_download=1, tamanho_fila=1,
+                                             caminho_banco=str(tmp_path / "pipeline.db"))
+
+
+def test_pipeline_fila_limitada_bloqueia_download(dataset, tmp_path, monkeypatch):
+    """Testa se, com o processamento parado, a fila limitada segura os workers de download"""
+    liberar_processamento = threading.Event()
+    baixados = []
+    processar_original = main.processar_periodo
+
+    def processar_apos_liberacao(*args, **kwargs):
+        assert liberar_processamento.wait(timeout=10)
+        return processar_original(*args, **kwargs)
+
+    monkeypatch.setattr(main, "processar_periodo", processar_apos_liberacao)
+    monkeypatch.setattr(main, "realizar_download_extrair", lambda alvo: baixados.append(alvo["periodo"]))
+
+    pipeline = threading.Thread(target=main.executar_pipeline_sobreposto,
+                                kwargs={"workers_download": 1, "tamanho_fila": 1,
+                                        "caminho_banco": str(tmp_path / "pipeline.db")})
+    pipeline.start()
+    try:
+        # 1 trimestre em processamento + 1 na fila + 1 worker bloqueado tentando enfileirar
+        for _ in range(100):
+            if len(baixados) == 3: break
+            time.sleep(0.05)
+        time.sleep(0.3)
+        assert len(baixados) == 3 < len(dataset["trimestres"])
+    finally:
+        liberar_processamento.set()
+        pipeline.join(timeout=30)
+    assert not pipeline.is_alive()
+    assert len(baixados) == len(dataset["trimestres"])
+
+
+def test_pipeline_propaga_erro_sem_travar(dataset, tmp_path, monkeypatch):
+    """Testa se uma falha em um estágio cancela os demais e é propagada"""
+    def download_com_falha(alvo):
+        raise IOError(f"falha simulada em {alvo['periodo']}")
+
+    monkeypatch.setattr(main, "realizar_download_extrair", download_com_falha)
+    with pytest.raises(RuntimeError, match="falha simulada"):
+        main.executar_pipeline_sobreposto(tamanho_fila=1, caminho_banco=str(tmp_path / "pipeline.db"))
+    assert not [nome for nome in os.listdir(tmp_path) if nome.endswith(".novo")]
+
+
+def test_carga_reprovada_mantem_banco_publicado(dataset, tmp_path, monkeypatch):
+    """Testa se um banco novo reprovado nas verificações não substitui a geração publicada"""
+    banco = str(tmp_path / "publicado.db")
+    resultado = processamento.executar_etl_financeiro()
+    assert main.persistir_dados_sqlite(resultado, banco) == len(resultado["operadoras_despesas"])
+    assert main.ler_geracao_banco(banco) == 1
+
+    with monkeypatch.context() as m:
+        m.setattr(main, "verificar_banco", lambda caminho, linhas: ["falha simulada"])
+        with pytest.raises(RuntimeError, match="reprovado"):
+            main.persistir_dados_sqlite(resultado, banco)
+    assert main.ler_geracao_banco(banco) == 1
+    assert not [nome for nome in os.listdir(tmp_path) if nome.endswith(".novo")]
+
+    assert main.persistir_dados_sqlite(resultado, banco) > 0
+    assert main.ler_geracao_banco(banco) == 2
+
+
+def test_cargas_simultaneas_publicam_geracoes_distintas(dataset, tmp_path, monkeypatch):
+    """Testa se duas cargas sobrepostas não apagam o arquivo uma da outra nem repetem a geração"""
+    banco = str(tmp_path / "publicado.db")
+    resultado = processamento.executar_etl_financeiro()
+
+    # Segura as duas cargas até que ambas tenham construído seu arquivo
+    ambas_construidas = threading.Barrier(2, timeout=30)
+    verificar_original = main.verificar_banco
+
+    def verificar_apos_as_duas(caminho, linhas):
+        ambas_construidas.wait()
+        return verificar_original(caminho, linhas)
+
+    monkeypatch.setattr(main, "verificar_banco", verificar_apos_as_duas)
+    erros = []
+
+    def carregar():
+        try:
+            main.persistir_dados_sqlite(resultado, banco)
+        except Exception as e:
+            erros.append(e)
+
+    cargas = [threading.Thread(target=carregar) for _ in range(2)]
+    for carga in cargas:
+        carga.start()
+    for carga in cargas:
+        carga.join()
+
+    assert not erros
+    assert main.ler_geracao_banco(banco) == 2
+    assert not [nome for nome in os.listdir(tmp_path) if nome.endswith(".novo")]
+
+
+def test_carga_reprovada_encerra_com_erro(dataset, tmp_path, monkeypatch):
+    """Testa se main() registra 'erro' no manifesto e sai com código diferente de zero"""
+    monkeypatch.setattr(main, "verificar_banco", lambda caminho, linhas: ["falha simulada"])
+    codigo, manifesto = _executar_main(tmp_path, monkeypatch, ["--pipeline"])
+
+    assert codigo == 1
+    assert manifesto["status"] == "erro" and "reprovado" in manifesto["erro"]
+    assert not os.path.exists(main.DB_PATH)
+
+
+def _executar_main(tmp_path, monkeypatch, argv):
+    """Executa main.main com saídas em tmp_path e retorna o código de saída e o manifesto gravado"""
+    monkeypatch.setattr(main, "DB_PATH", str(tmp_path / "intuitive_care.db"))
+    monkeypatch.setattr(main, "MANIFESTO_PATH", str(tmp_path / "manifesto_execucao.json"))
+    monkeypatch.setattr(main, "DIR_PERFIS", str(tmp_path / "perfis"))
+    try:
+        main.main(argv)
+        codigo = 0
+    except SystemExit as e:
+        codigo = e.code
+    with open(main.MANIFESTO_PATH, encoding="utf-8") as f:
+        return codigo, json.load(f)
+
+
+def _executar_main_perfilado(tmp_path, monkeypatch, argv):
+    """Executa main.main com sucesso e retorna as etapas do manifesto por nome"""
+    codigo, manifesto = _executar_main(tmp_path, monkeypatch, argv)
+    assert codigo == 0
+    return {e["nome"]: e for e in manifesto["etapas"]}
+
+
+def test_perfilar_etapas_aninhadas(dataset, tmp_path, monkeypatch):
+    """Testa se --perfilar mantém o perfil da etapa externa completo quando há etapas aninhadas"""
+    etapas = _executar_main_perfilado(tmp_path, monkeypatch, ["--pipeline", "--perfilar"])
+    externa = etapas["pipeline"]["arquivo_perfil"]
+
+    # Consolidação e publicação rodam dentro da etapa pipeline: ficam contidas no mesmo perfil
+    for nome in ("consolidacao", "sql_validacao", "sql_deduplicacao", "publicacao"):
+        assert etapas[nome]["arquivo_perfil"] == externa
+    funcoes = {chave[2] for chave in pstats.Stats(externa).stats}
+    assert {"executar_pipeline_sobreposto", "consolidar_staging", "publicar_banco"} <= funcoes
+
+
+def test_perfilar_motor_sql(dataset, tmp_path, monkeypatch):
+    """Testa se as etapas sql_* do motor SQL ficam contidas no perfil completo do processamento"""
+    monkeypatch.setattr(main, "executar_coleta", lambda qtd=None: None)
+    etapas = _executar_main_perfilado(tmp_path, monkeypatch, ["--motor", "sql", "--perfilar"])
+    externa = etapas["processamento"]["arquivo_perfil"]
+
+    for nome in ("sql_pre_agregacao", "sql_validacao", "sql_agregado_2_3", "sql_deduplicacao"):
+        assert etapas[nome]["arquivo_perfil"] == externa
+    # adicionar_chave_periodo roda depois da última etapa aninhada
+    funcoes = {chave[2] for chave in pstats.Stats(externa).stats}
+    assert {"carregar_arquivo_staging", "adicionar_chave_periodo"} <= funcoes
@@ -0,0 +1,123 @@
+import os
+import random
+
+import pandas as pd
+import pytest
+
+from src import processamento, processamento_sql
+from benchmarks.apoio_sintetico import redirecionar_caminhos_etl
+from src.dados_sinteticos import gerar_cnpj, gerar_dataset_sintetico
+
+
+def test_validar_digitos_cnpj():
+    """Testa a validação de dígitos com CNPJs válidos e corrompidos"""
+    rng = random.Random(1)
+    assert all(processamento.validar_digitos_cnpj(gerar_cnpj(rng)) for _ in range(200))
+    assert not any(processamento.validar_digitos_cnpj(gerar_cnpj(rng, valido=False)) for _ in range(200))
+    assert not processamento.validar_digitos_cnpj("11111111111111")
+
+
+def test_gerador_deterministico(tmp_path):
+    """Testa se a mesma semente gera exatamente os mesmos arquivos"""
+    a = gerar_dataset_sintetico(str(tmp_path / "a"), qtd_operadoras=10, linhas_por_operadora=5)
+    b = gerar_dataset_sintetico(str(tmp_path / "b"), qtd_operadoras=10, linhas_por_operadora=5)
+    for arq_a, arq_b in zip(a["arquivos"], b["arquivos"]):
+        with open(arq_a["caminho"], "rb") as fa, open(arq_b["caminho"], "rb") as fb:
+            assert fa.read() == fb.read()
+
+
+def test_ler_arquivo_csv_variantes(dataset):
+    """Testa a leitura de cada combinação de encoding/separador gerada"""
+    variantes = {(a["encoding"], a["sep"]) for a in dataset["arquivos"]}
+    assert variantes == {("utf-8", ";"), ("latin1", ";"), ("utf-8", ",")}
+
+    for arquivo in dataset["arquivos"]:
+        df = processamento.ler_arquivo_csv(arquivo["caminho"])
+        assert len(df) == arquivo["linhas"]
+        assert "VL_SALDO_FINAL" in df.columns
+        assert df["DESCRICAO"].str.contains("SAÚDE").any()
+
+
+def test_etl_dados_sinteticos(dataset):
+    """Testa o ETL completo: apenas CNPJs válidos e uma linha por operadora/trimestre"""
+    resultado = processamento.executar_etl_financeiro()
+    df = resultado["operadoras_despesas"]
+
+    assert not df.empty
+    assert df["CNPJ"].apply(processamento.validar_digitos_cnpj).all()
+    assert not df.duplicated(subset=["Registro_ANS", "Ano", "Trimestre"]).any()
+    assert set(df["Trimestre"] + df["Ano"]) == set(dataset["trimestres"])
+
+
+def test_etl_particionado_reaproveita_particoes(dataset, monkeypatch):
+    """Testa se o modo particionado gera o mesmo resultado e reaproveita as partições na 2ª execução"""
+    colunas = ["Registro_ANS", "Ano", "Trimestre"]
+    esperado = processamento.executar_etl_financeiro()["operadoras_despesas"].sort_values(colunas)
+
+    particionado = processamento.executar_etl_financeiro(usar_particoes=True)["operadoras_despesas"]
+    for periodo in dataset["trimestres"]:
+        assert os.path.exists(processamento.caminho_particao(periodo))
+
+    # Na segunda execução nenhum CSV bruto pode ser relido
+    monkeypatch.setattr(processamento, "preprocessar_arquivo_demonstracao",
+                        lambda *args: pytest.fail("partição deveria ter sido reaproveitada"))
+    reaproveitado = processamento.executar_etl_financeiro(usar_particoes=True)["operadoras_despesas"]
+
+    for df in (particionado, reaproveitado):
+        pd.testing.assert_frame_equal(df.sort_values(colunas)[esperado.columns].reset_index(drop=True),
+                                      esperado.reset_index(drop=True))
+
+
+def test_motor_sql_equivalente_ao_pandas(dataset, tmp_path):
+    """Testa se o motor SQL out-of-core gera a mesma tabela e os mesmos relatórios do motor pandas"""
+    textos = ("CNPJ", "RazaoSocial", "UF", "Trimestre", "Ano")
+    saidas = {}
+    for motor, executar in [("pandas", processamento.executar_etl_financeiro),
+                            ("sql", lambda: processamento_sql.executar_etl_financeiro_sql(tamanho_lote=37))]:
+        with redirecionar_caminhos_etl(dataset, str(tmp_path / f"saida_{motor}")):
+            df = executar()["operadoras_despesas"]
+            relatorios = {nome: pd.read_csv(os.path.join(processamento.PATH_SAIDA_PROCESSADA, nome), sep=';',
+                                            decimal=decimal, dtype={c: str for c in textos})
+                          for nome, decimal in (("Teste_Alessandro_Barbosa.zip", ","), ("consolidado_despesas.zip", "."))}
+        saidas[motor] = (df.reset_index(drop=True), relatorios)
+
+    pd.testing.assert_frame_equal(saidas["sql"][0], saidas["pandas"][0])
+    assert not os.path.exists(str(tmp_path / "saida_sql" / "staging_etl.db"))
+
+    for nome, esperado in saidas["pandas"][1].items():
+        obtido = saidas["sql"][1][nome]
+        assert list(obtido.columns) == list(esperado.columns)
+        colunas_texto = [c for c in esperado.columns if c in textos]
+        colunas_valor = [c for c in esperado.columns if c not in textos]
+        assert colunas_valor, nome
+        pd.testing.assert_frame_equal(obtido[colunas_texto], esperado[colunas_texto])
+        # Somas e desvios acumulados em ordem diferente (SQLite x pandas) só diferem no arredondamento
+        pd.testing.assert_frame_equal(obtido[colunas_valor], esperado[colunas_valor], check_exact=False)
+
+
+def test_motor_sql_reaproveita_particoes(dataset, monkeypatch):
+    """Testa se o motor SQL no backfill grava e reaproveita as mesmas partições do motor pandas"""
+    colunas = ["Registro_ANS", "Ano", "Trimestre"]
+    esperado = processamento.executar_etl_financeiro(usar_particoes=True)["operadoras_despesas"]
+    esperado = esperado.sort_values(colunas).reset_index(drop=True)
+
+    def comparar(df):
+        pd.testing.assert_frame_equal(df.sort_values(colunas)[esperado.columns].reset_index(drop=True), esperado,
+                                      check_exact=False)
+
+    # Partições gravadas pelo motor pandas: nenhum CSV bruto pode ser relido pelo motor SQL
+    with monkeypatch.context() as m:
+        m.setattr(processamento_sql, "carregar_arquivo_staging",
+                  lambda *args: pytest.fail("partição deveria ter sido reaproveitada"))
+        comparar(processamento_sql.executar_etl_financeiro_sql(usar_particoes=True)["operadoras_despesas"])
+
+    # Partições regravadas pelo motor SQL são reaproveitadas pelo motor pandas
+    for periodo in dataset["trimestres"]:
+        os.remove(processamento.caminho_particao(periodo))
+    comparar(processamento_sql.executar_etl_financeiro_sql(usar_particoes=True)["operadoras_despesas"])
+    for periodo in dataset["trimestres"]:
+        assert os.path.exists(processamento.caminho_particao(periodo))
+
+    monkeypatch.setattr(processamento, "preprocessar_arquivo_demonstracao",
+                        lambda *args: pytest.fail("partição deveria ter sido reaproveitada"))
+    comparar(processamento.executar_etl_financeiro(usar_particoes=True)["operadoras_despesas"])